@@ -0,0 +1,42 @@
+import argparse
+import json
+
+from dotenv import load_dotenv
+
+from .connections import get_db_router, get_review_shards
+from .main import init_db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m app')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('init-db', help='Create the database schema')
+    commands.add_parser(
+        'shard-reviews', help='Move reviews from the primary to REVIEW_SHARD_URLS'
+    )
+    snapshot = commands.add_parser(
+        'snapshot', help='Dump films, users and reviews in a columnar format'
+    )
+    snapshot.add_argument('directory', help='Where to write the snapshot')
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.command == 'init-db':
+        init_db()
+    elif args.command == 'shard-reviews':
+        shards = get_review_shards()
+        if shards is None:
+            parser.error('REVIEW_SHARD_URLS lists no shard databases')
+        shards.create_schema()
+        moved = shards.move_reviews(get_db_router().engine)
+        print(f'Moved {moved} reviews to the shards')
+    elif args.command == 'snapshot':
+        from .snapshot import take_snapshot  # pylint: disable=import-outside-toplevel
+
+        with get_db_router().read_session() as db:
+            manifest = take_snapshot(args.directory, db)
+        print(json.dumps(manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import asyncio
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+WRITE, CHEAP, EXPENSIVE, REGISTER = 'write', 'cheap', 'expensive', 'register'
+
+# Served first when a slot frees up
+PRIORITY = (WRITE, CHEAP, EXPENSIVE, REGISTER)
+
+EXPENSIVE_ROUTES = [
+    re.compile(r'^/films/filter/average/?$'),
+    re.compile(r'^/users/?$'),
+    re.compile(r'^/snapshot/?$'),
+]
+
+# Registration needs no credentials and costs a full password hash, so
+# anyone can flood it; it gets its own small class, served last
+REGISTER_ROUTE = re.compile(r'^/users/?$')
+
+
+@dataclass
+class ClassLimit:
+    max_concurrency: int
+    max_queue: int
+
+
+def parse_limits(value: str) -> Dict[str, ClassLimit]:
+    """Parses `write=16:64,cheap=32:128` into concurrency and queue limits."""
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, limit = item.partition('=')
+        concurrency, _, queue = limit.partition(':')
+        limits[name.strip()] = ClassLimit(int(concurrency), int(queue or 0))
+    return limits
+
+
+def classify(method: str, path: str) -> str:
+    if method == 'POST' and REGISTER_ROUTE.match(path):
+        return REGISTER
+    if method not in ('GET', 'HEAD', 'OPTIONS'):
+        return WRITE
+    if any(pattern.match(path) for pattern in EXPENSIVE_ROUTES):
+        return EXPENSIVE
+    return CHEAP
+
+
+class AdmissionController:
+    """
+    Lets at most `capacity` requests in at once, each route class being
+    further limited to its own concurrency. Requests over the limit wait in
+    a bounded per-class queue for up to `queue_timeout` seconds; a full
+    queue or a timeout rejects the request. Lives in the event loop thread,
+    so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 40,
+        limits: Optional[Dict[str, ClassLimit]] = None,
+        queue_timeout: float = 2.0,
+    ) -> None:
+        self.capacity = capacity
+        self.limits = {
+            WRITE: ClassLimit(capacity, capacity * 2),
+            CHEAP: ClassLimit(capacity, capacity * 2),
+            EXPENSIVE: ClassLimit(max(capacity // 4, 1), capacity // 2),
+            REGISTER: ClassLimit(max(capacity // 4, 1), capacity // 2),
+            **(limits or {}),
+        }
+        self.queue_timeout = queue_timeout
+        self.active = {name: 0 for name in self.limits}
+        self.admitted = {name: 0 for name in self.limits}
+        self.rejected = {name: 0 for name in self.limits}
+        self.queues: Dict[str, Deque['asyncio.Future[None]']] = {
+            name: deque() for name in self.limits
+        }
+
+    def _can_enter(self, route_class: str) -> bool:
+        return (
+            sum(self.active.values()) < self.capacity
+            and self.active[route_class] < self.limits[route_class].max_concurrency
+        )
+
+    def _enter(self, route_class: str) -> None:
+        self.active[route_class] += 1
+        self.admitted[route_class] += 1
+
+    async def acquire(self, route_class: str) -> bool:
+        queue = self.queues[route_class]
+        if not queue and self._can_enter(route_class):
+            self._enter(route_class)
+            return True
+        if len(queue) >= self.limits[route_class].max_queue:
+            self.rejected[route_class] += 1
+            return False
+
+        waiter: 'asyncio.Future[None]' = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:  # the client has gone away
+            if waiter.done():
+                self.release(route_class)
+            else:
+                waiter.cancel()
+                queue.remove(waiter)
+            raise
+
+        if not waiter.done():
+            waiter.cancel()
+            queue.remove(waiter)
+            self.rejected[route_class] += 1
+            return False
+        return True
+
+    def release(self, route_class: str) -> None:
+        self.active[route_class] -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        for route_class in PRIORITY:
+            queue = self.queues.get(route_class)
+            while queue and self._can_enter(route_class):
+                self._enter(route_class)
+                queue.popleft().set_result(None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {
+                'active': self.active[name],
+                'queued': len(self.queues[name]),
+                'max_concurrency': limit.max_concurrency,
+                'max_queue': limit.max_queue,
+                'admitted': self.admitted[name],
+                'rejected': self.rejected[name],
+            }
+            for name, limit in self.limits.items()
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self, app: ASGIApp, controller: AdmissionController, retry_after: int = 1
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify(scope['method'], scope['path'])
+        if not await self.controller.acquire(route_class):
+            response = JSONResponse(
+                {'detail': 'Service is overloaded, try again later'},
+                status_code=503,
+                headers={'Retry-After': str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
@@ -0,0 +1,110 @@
+import bisect
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+class CatalogueEntry:
+    """A film as the catalogue keeps it; enough for `schemas.Film`."""
+
+    __slots__ = ('name', 'release_year')
+
+    def __init__(self, name: str, release_year: Optional[int]) -> None:
+        self.name = name
+        self.release_year = release_year
+
+
+class CatalogueIndex:
+    """
+    Films kept in memory for existence checks and year filters. Names are
+    interned and map to their entries; `films` holds the entries in
+    `film_id` order, which is the order SQLite returns them in, with the
+    ids alongside in an array, and every release year has a sorted array
+    of positions in `films`.
+
+    Films are never deleted, so a name found here exists. A name not found
+    may have just been created by another worker, so callers fall back to
+    the database on a miss.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.by_name: Dict[str, CatalogueEntry] = {}
+        self.films: List[CatalogueEntry] = []
+        self.film_ids: 'array[int]' = array('q')
+        self.by_year: Dict[int, 'array[int]'] = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.loaded = False
+            self.by_name = {}
+            self.films = []
+            self.film_ids = array('q')
+            self.by_year = {}
+
+    def load(self, db: Session) -> None:
+        rows = (
+            db.query(models.Film.film_id, models.Film.name, models.Film.release_year)
+            .order_by(models.Film.film_id)
+            .all()
+        )
+        with self._lock:
+            self.films = [
+                CatalogueEntry(sys.intern(name), release_year)
+                for _, name, release_year in rows
+            ]
+            self.film_ids = array('q', (film_id for film_id, _, _ in rows))
+            self.by_name = {entry.name: entry for entry in self.films}
+            self._index_years()
+            self.loaded = True
+
+    def _index_years(self) -> None:
+        by_year: Dict[int, 'array[int]'] = {}
+        for position, entry in enumerate(self.films):
+            if entry.release_year is not None:
+                by_year.setdefault(entry.release_year, array('I')).append(position)
+        self.by_year = by_year
+
+    def add(self, film_id: int, name: str, release_year: Optional[int]) -> None:
+        with self._lock:
+            if not self.loaded or name in self.by_name:
+                return
+            entry = CatalogueEntry(sys.intern(name), release_year)
+            position = bisect.bisect(self.film_ids, film_id)
+            if position < len(self.films):
+                # another worker's film arrived late: rare, so just re-index
+                films = self.films.copy()
+                films.insert(position, entry)
+                film_ids = array('q', self.film_ids)
+                film_ids.insert(position, film_id)
+                self.films, self.film_ids = films, film_ids
+                self._index_years()
+            else:
+                self.films.append(entry)
+                self.film_ids.append(film_id)
+                if release_year is not None:
+                    self.by_year.setdefault(release_year, array('I')).append(position)
+            self.by_name[entry.name] = entry
+
+    def get(self, name: str) -> Optional[CatalogueEntry]:
+        return self.by_name.get(name)
+
+    def page(self, skip: int, limit: int) -> List[CatalogueEntry]:
+        return self.films[skip : skip + limit]
+
+    def filter_by_year(
+        self, release_year: int, skip: int, limit: int
+    ) -> List[CatalogueEntry]:
+        with self._lock:  # a re-index swaps both
+            films = self.films
+            positions = self.by_year.get(release_year, array('I'))
+        return [films[i] for i in positions[skip : skip + limit]]
+
+
+catalogue = CatalogueIndex()
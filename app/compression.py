@@ -0,0 +1,151 @@
+import gzip
+from typing import Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+Compressor = Callable[[bytes, int], bytes]
+
+# Already compressed, and possibly large: streamed through untouched
+INCOMPRESSIBLE_TYPES = ('application/zip', 'application/gzip')
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, compresslevel=min(max(level, 1), 9), mtime=0)
+
+
+def _brotli(body: bytes, level: int) -> bytes:  # pragma: no cover
+    return brotli.compress(body, quality=min(max(level, 0), 11))
+
+
+def _zstd(body: bytes, level: int) -> bytes:  # pragma: no cover
+    return zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compress(body)
+
+
+def available_encodings() -> Dict[str, Compressor]:
+    # Ordered by server preference: the first acceptable one wins on a tie
+    encodings: Dict[str, Compressor] = {}
+    if zstandard is not None:  # pragma: no cover
+        encodings['zstd'] = _zstd
+    if brotli is not None:  # pragma: no cover
+        encodings['br'] = _brotli
+    encodings['gzip'] = _gzip
+    return encodings
+
+
+def _quality(params: List[str]) -> float:
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() != 'q':
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+    return 1.0
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if coding:
+            weights[coding.lower()] = _quality(params)
+    return weights
+
+
+def negotiate_encoding(header: str, supported: List[str]) -> Optional[str]:
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for coding in supported:
+        weight = weights.get(coding, wildcard)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def is_incompressible(start: Message) -> bool:
+    content_type = Headers(raw=start['headers']).get('content-type', '')
+    return content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding accepted by the client.
+
+    The body is buffered until the response is complete, so the decision
+    to compress is made on the real size: bodies under `minimum_size`
+    bytes are sent as is, since compressing them costs more CPU than
+    it saves on the wire.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        level: int = 6,
+        encodings: Optional[List[str]] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        compressors = available_encodings()
+        if encodings is not None:
+            compressors = {
+                name: compressors[name] for name in encodings if name in compressors
+            }
+        self.compressors = compressors
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept = Headers(scope=scope).get('accept-encoding', '')
+        encoding = negotiate_encoding(accept, list(self.compressors))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                if is_incompressible(message):
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message['type'] != 'http.response.body' or start is None:
+                await send(message)
+                return
+
+            chunks.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            body = b''.join(chunks)
+            headers = MutableHeaders(raw=start['headers'])
+            if 'content-encoding' not in headers:
+                headers.add_vary_header('Accept-Encoding')
+                if len(body) >= self.minimum_size:
+                    body = self.compressors[encoding](body, self.level)
+                    headers['Content-Encoding'] = encoding
+                    headers['Content-Length'] = str(len(body))
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,32 @@
+"""
+The databases the app runs on, built from the environment on first use, so
+that importing the app stays cheap.
+"""
+import functools
+import os
+from typing import Optional
+
+from .database import DatabaseRouter, make_engine
+from .sharding import ReviewShards
+
+
+@functools.lru_cache(maxsize=None)
+def get_review_shards() -> Optional[ReviewShards]:
+    """Sharding is on when REVIEW_SHARD_URLS lists the shard databases."""
+    urls = os.environ.get('REVIEW_SHARD_URLS', '')
+    engines = [make_engine(url.strip()) for url in urls.split(',') if url.strip()]
+    if not engines:
+        return None
+    return ReviewShards(engines, int(os.environ.get('REVIEW_SHARD_WORKERS', 0)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_db_router() -> DatabaseRouter:
+    shards = get_review_shards()
+    replica_urls = os.environ.get('SQLALCHEMY_REPLICA_URLS', '')
+    return DatabaseRouter(
+        make_engine(os.environ['SQLALCHEMY_DATABASE_URL']),
+        [make_engine(url.strip()) for url in replica_urls.split(',') if url.strip()],
+        sticky_seconds=float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5.0)),
+        session_factory=None if shards is None else shards.session_maker,
+    )
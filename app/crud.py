@@ -1,44 +1,78 @@
-import hashlib
-from typing import List, Optional
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import DefaultDict, List, Optional, Tuple, Union
 
+from sqlalchemy import lambda_stmt, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 
 from . import models, schemas
+from .catalogue import CatalogueEntry, catalogue
+from .invalidation import bus
+from .sharding import film_bind_arguments, shards_of
+from .trending import timestamp
 
+FilmRecord = Union[models.Film, CatalogueEntry]
 
-def get_user_in_db(db: Session, user: schemas.UserInDB) -> Optional[models.User]:
-    return (
-        db.query(models.User)
-        .filter(models.User.login == user.login)
-        .filter(models.User.hashed_password == user.hashed_password)
-    ).first()
 
+def film_exists(db: Session, film_name: str) -> bool:
+    if catalogue.get(film_name) is not None:
+        return True
+    # not loaded, or created by another worker since the last poll
+    film = db.query(models.Film.name).filter(models.Film.name == film_name).first()
+    return film is not None
 
-def get_users(db: Session, skip: int = 0, limit: int = 10) -> List[models.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+
+# The hot paths below use lambda statements: SQLAlchemy caches them by the
+# code of the lambda, so neither the statement nor its SQL is rebuilt per call
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
+def get_user(db: Session, login: str) -> Optional[models.User]:
+    statement = lambda_stmt(
+        lambda: select(models.User).where(models.User.login == login)
+    )
+    return db.execute(statement).scalars().first()
+
+
+def update_user_password(db: Session, login: str, hashed_password: str) -> None:
+    db.query(models.User).filter(models.User.login == login).update(
+        {models.User.hashed_password: hashed_password}, synchronize_session=False
+    )
+    db.commit()
+
+
+def get_users(db: Session, skip: int = 0, limit: int = 10) -> List[models.User]:
+    users = db.query(models.User).offset(skip).limit(limit).all()
+    shards = shards_of(db)
+    if shards is not None and users:
+        # one query per shard, all at once, instead of a lazy load per user
+        reviews = shards.reviews_by_login([user.login for user in users])
+        for user in users:
+            set_committed_value(user, 'film_reviews', reviews[user.login])
+    return users
+
+
+def create_user(
+    db: Session, user: schemas.UserCreate, hashed_password: str
+) -> models.User:
     user_in_db = (
         db.query(models.User.login).filter(models.User.login == user.login).first()
     )
     if user_in_db is not None:
         raise ValueError(f'User with login {user.login} already exists in database')
 
-    password = user.password.encode('utf-8')
-    hashed_password = hashlib.sha256(password).hexdigest()
-
     db_user = models.User(login=user.login, hashed_password=hashed_password)
     db.add(db_user)
+    bus.publish(db, 'user', user.login)
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
 def get_user_review(db: Session, film_name: str, username: str) -> models.FilmReview:
-    film = db.query(models.Film.name).filter(models.Film.name == film_name).first()
-    if film is None:
+    if not film_exists(db, film_name):
         raise ValueError(f'Film with name {film_name} does not exist in database')
 
     return (
@@ -51,12 +85,7 @@ def get_user_review(db: Session, film_name: str, username: str) -> models.FilmRe
 def create_user_review(
     db: Session, username: str, film_review: schemas.ReviewCreate
 ) -> models.FilmReview:
-    film = (
-        db.query(models.Film.name)
-        .filter(models.Film.name == film_review.film_name)
-        .first()
-    )
-    if film is None:
+    if not film_exists(db, film_review.film_name):
         raise ValueError(
             f'Film with name {film_review.film_name} does not exist in database'
         )
@@ -72,9 +101,20 @@ def create_user_review(
             f'Film with name {film_review.film_name} have already been reviewed by user {username}'
         )
 
-    db_review = models.FilmReview(**film_review.dict(), login=username)
+    created_at = datetime.utcnow()
+    db_review = models.FilmReview(
+        **film_review.dict(), login=username, created_at=created_at
+    )
     db.add(db_review)
+    payload = {
+        'login': username,
+        'mark': film_review.mark,
+        'created_at': timestamp(created_at),
+    }
+    change = bus.publish(db, 'review', film_review.film_name, json.dumps(payload))
     db.commit()
+    # the trending counters of this worker count the review right away
+    bus.announce(change)
     db.refresh(db_review)
     return db_review
 
@@ -82,6 +122,20 @@ def create_user_review(
 def get_user_reviews(
     db: Session, username: str, skip: int = 0, limit: int = 10
 ) -> List[models.FilmReview]:
+    shards = shards_of(db)
+    if shards is not None:
+        # every shard may hold some of them: take a page from each, then merge
+        pages = shards.scatter(
+            lambda shard: (
+                shard.query(models.FilmReview)
+                .filter(models.FilmReview.login == username)
+                .order_by(models.FilmReview.film_name)
+                .limit(skip + limit)
+            ).all()
+        )
+        merged = sorted((r for page in pages for r in page), key=lambda r: r.film_name)
+        return merged[skip : skip + limit]
+
     reviews = (
         db.query(models.FilmReview)
         .filter(models.FilmReview.login == username)
@@ -91,32 +145,44 @@ def get_user_reviews(
     return reviews
 
 
-def get_films(db: Session, skip: int = 0, limit: int = 10) -> List[models.Film]:
-    return db.query(models.Film).offset(skip).limit(limit).all()
+def get_films(db: Session, skip: int = 0, limit: int = 10) -> List[FilmRecord]:
+    if catalogue.loaded:
+        return catalogue.page(skip, limit)
+    statement = lambda_stmt(lambda: select(models.Film).offset(skip).limit(limit))
+    return db.execute(statement).scalars().all()
 
 
 def get_film_reviews(
     db: Session, film_name: str, skip: int = 0, limit: int = 10
 ) -> List[models.FilmReview]:
-    return (
-        db.query(models.FilmReview)
-        .filter(models.FilmReview.film_name == film_name)
+    statement = lambda_stmt(
+        lambda: select(models.FilmReview)
+        .where(models.FilmReview.film_name == film_name)
         .offset(skip)
         .limit(limit)
-    ).all()
+    )
+    bind_arguments = film_bind_arguments(db, film_name)
+    return db.execute(statement, bind_arguments=bind_arguments).scalars().all()
 
 
-def create_film(db: Session, film: schemas.FilmCreate) -> models.Film:
-    film_in_db = (
-        db.query(models.Film.name).filter(models.Film.name == film.name).first()
-    )
-    if film_in_db is not None:
+def create_film(
+    db: Session, film: schemas.FilmCreate, username: Optional[str] = None
+) -> models.Film:
+    if film_exists(db, film.name):
         raise ValueError(f'Film with name {film.name} already exists in database')
 
     db_film = models.Film(**film.dict())
     db.add(db_film)
+    db.flush()
+    payload = {
+        'film_id': db_film.film_id,
+        'release_year': film.release_year,
+        'login': username,
+    }
+    bus.publish(db, 'film', film.name, json.dumps(payload))
     db.commit()
     db.refresh(db_film)
+    catalogue.add(db_film.film_id, db_film.name, db_film.release_year)
     return db_film
 
 
@@ -133,7 +199,9 @@ def get_films_filterby_substring(
 
 def get_films_filterby_release_year(
     db: Session, release_year: int, skip: int = 0, limit: int = 10
-) -> List[models.Film]:
+) -> List[FilmRecord]:
+    if catalogue.loaded:
+        return catalogue.filter_by_year(release_year, skip, limit)
     return (
         db.query(models.Film)
         .filter(models.Film.release_year == release_year)
@@ -145,6 +213,10 @@ def get_films_filterby_release_year(
 def get_films_filterby_average(
     db: Session, skip: int = 0, limit: int = 10
 ) -> List[models.Film]:
+    shards = shards_of(db)
+    if shards is not None:
+        return _get_films_filterby_average_sharded(db, skip, limit)
+
     return (
         db.query(models.Film)
         .join(models.FilmReview)
@@ -155,6 +227,35 @@ def get_films_filterby_average(
     ).all()
 
 
+def _get_films_filterby_average_sharded(
+    db: Session, skip: int, limit: int
+) -> List[models.Film]:
+    partials = shards_of(db).scatter(  # type: ignore
+        lambda shard: (
+            shard.query(
+                models.FilmReview.film_name,
+                func.sum(models.FilmReview.mark),
+                func.count(models.FilmReview.mark),
+            ).group_by(models.FilmReview.film_name)
+        ).all()
+    )
+    totals: DefaultDict[str, Tuple[int, int]] = defaultdict(lambda: (0, 0))
+    for partial in partials:
+        for film_name, marks, count in partial:
+            total, total_count = totals[film_name]
+            totals[film_name] = (total + marks, total_count + count)
+
+    ranking = sorted(
+        totals, key=lambda name: (-totals[name][0] / totals[name][1], name)
+    )
+    names = ranking[skip : skip + limit]
+    films = {
+        film.name: film
+        for film in db.query(models.Film).filter(models.Film.name.in_(names))
+    }
+    return [films[name] for name in names if name in films]
+
+
 def get_film_info_extended(
     db: Session, film_name: str, skip: int = 0, limit: int = 10
 ) -> schemas.FilmExtended:
@@ -167,18 +268,16 @@ def get_film_info_extended(
         db.query(
             func.count(models.FilmReview.mark).label('num_mark'),
             func.avg(models.FilmReview.mark).label('average'),
-        )
-        .join(models.Film)
-        .filter(models.FilmReview.film_name == film_name)
+        ).filter(models.FilmReview.film_name == film_name)
     ).first()
 
     num_review = (
-        db.query(models.FilmReview)
+        db.query(func.count(models.FilmReview.film_name))
         .filter(models.FilmReview.film_name == film_name)
         .filter(  # pylint: disable=singleton-comparison
             models.FilmReview.review != None  # noqa: E711
         )
-    ).count()  # It should be exactly like it is
+    ).scalar()  # It should be exactly like it is
 
     average = None
     if data.average is not None:  # set precision to two digits
@@ -190,7 +289,7 @@ def get_film_info_extended(
         average_mark=average,
         number_of_marks=data.num_mark,
         number_of_reviews=num_review,
-        reviews=film.reviewers[skip : skip + limit],
+        reviews=get_film_reviews(db, film_name, skip, limit),
     )
 
     return extended
@@ -1,14 +1,186 @@
-import os
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
 
-import dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import Table, create_engine, event, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 Base = declarative_base()
 
-dotenv.load_dotenv()
 
-db_url = os.environ.get('SQLALCHEMY_DATABASE_URL')
-engine = create_engine(db_url, connect_args={'check_same_thread': False})
-LocalSession = sessionmaker(bind=engine)
+def enable_wal(engine_: Engine) -> None:
+    # WAL lets readers of other worker processes run alongside the writer
+    if engine_.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine_, 'connect')
+    def set_journal_mode(dbapi_connection, _):  # type: ignore
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.close()
+
+
+def add_missing_columns(engine_: Engine, tables: Sequence[Table]) -> None:
+    """Adds nullable columns that existing tables were created without."""
+    inspector = inspect(engine_)
+    with engine_.begin() as connection:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing = [
+                c for c in table.columns if c.name not in existing and c.nullable
+            ]
+            for column in missing:
+                type_ = column.type.compile(dialect=engine_.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {type_}'
+                )
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+
+def begin_transaction(connection: Connection) -> None:
+    """
+    Opens the transaction on the database itself: pysqlite only does that
+    before an INSERT, UPDATE or DELETE, so SELECTs and DDL before the first
+    one would otherwise each run on their own.
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('BEGIN')
+
+
+def enable_autoincrement(engine_: Engine, table: Table) -> None:
+    """
+    Rebuilds a SQLite table created without AUTOINCREMENT, so that the ids
+    of deleted rows are never handed out again.
+    """
+    if engine_.dialect.name != 'sqlite' or not inspect(engine_).has_table(table.name):
+        return
+    with engine_.connect() as connection, connection.begin():
+        begin_transaction(connection)
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table.name,),
+        ).scalar()
+        if 'AUTOINCREMENT' in sql.upper():
+            return
+        indexes = inspect(connection).get_indexes(table.name)
+        connection.exec_driver_sql(
+            f'ALTER TABLE {table.name} RENAME TO {table.name}_old'
+        )
+        for index in indexes:
+            connection.exec_driver_sql(f'DROP INDEX {index["name"]}')
+        table.create(bind=connection)
+        columns = ', '.join(column.name for column in table.columns)
+        connection.exec_driver_sql(
+            f'INSERT INTO {table.name} ({columns}) '
+            f'SELECT {columns} FROM {table.name}_old'
+        )
+        connection.exec_driver_sql(f'DROP TABLE {table.name}_old')
+
+
+class StatementCacheStats:
+    """Counts how often statements are served from the compiled cache."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self._lock = threading.Lock()
+
+    def record(  # pylint: disable=too-many-arguments
+        self,
+        _connection: Any,
+        _cursor: Any,
+        _statement: str,
+        _parameters: Any,
+        context: Any,
+        _executemany: bool,
+    ) -> None:
+        with self._lock:
+            if context.cache_hit is CACHE_HIT:
+                self.hits += 1
+            elif context.cache_hit is CACHE_MISS:
+                self.misses += 1
+            else:
+                self.uncached += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.uncached = 0
+
+    def stats(self) -> Dict[str, float]:
+        cached = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'uncached': self.uncached,
+            'hit_rate': self.hits / cached if cached else 0.0,
+        }
+
+
+statement_cache_stats = StatementCacheStats()
+
+
+def make_engine(url: str) -> Engine:
+    engine_ = create_engine(url, connect_args={'check_same_thread': False})
+    enable_wal(engine_)
+    event.listen(engine_, 'after_cursor_execute', statement_cache_stats.record)
+    return engine_
+
+
+class DatabaseRouter:
+    """
+    Sends writes to the primary and spreads reads over the replicas.
+
+    A key (the user login) that has just written something is pinned to the
+    primary for `sticky_seconds`, so the user reads their own writes even
+    if the replicas have not caught up yet.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Sequence[Engine] = (),
+        sticky_seconds: float = 5.0,
+        session_factory: Optional[Callable[[Engine], Callable[[], Session]]] = None,
+    ) -> None:
+        make_session = session_factory or (lambda engine_: sessionmaker(bind=engine_))
+        self.engine = primary
+        self.replicas = list(replicas)
+        self.writer = make_session(primary)
+        self.readers = [make_session(replica) for replica in self.replicas]
+        self.sticky_seconds = sticky_seconds
+        self._sticky: Dict[str, float] = {}
+        self._next_reader = itertools.cycle(range(max(len(self.readers), 1)))
+        self._lock = threading.Lock()
+
+    def write_session(self) -> Session:
+        return self.writer()
+
+    def read_session(self, key: Optional[str] = None) -> Session:
+        if not self.readers or (key is not None and self.is_sticky(key)):
+            return self.writer()
+        with self._lock:
+            index = next(self._next_reader)
+        return self.readers[index]()
+
+    def mark_written(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[key] = now + self.sticky_seconds
+            expired = [k for k, until in self._sticky.items() if until <= now]
+            for k in expired:
+                del self._sticky[k]
+
+    def is_sticky(self, key: str) -> bool:
+        return self._sticky.get(key, 0.0) > time.monotonic()
+
+    def dispose(self) -> None:
+        for engine_ in [self.engine, *self.replicas]:
+            engine_.dispose()
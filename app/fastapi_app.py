@@ -1,59 +1,125 @@
-import hashlib
+import asyncio
 import logging
 from typing import Generator, List
 
-from fastapi import Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBasicCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from . import app, crud, models, schemas, security
-from .database import LocalSession
+from . import crud, models, passwords, schemas, security
+from .connections import get_db_router
+from .invalidation import bus
+from .trending import trending
 
 
 def get_db() -> Generator[Session, None, None]:
-    db = LocalSession()
+    db = get_db_router().write_session()
     try:
         yield db
     finally:
         db.close()
 
 
-def get_current_username(
-    credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)
+def get_read_db(
+    credentials: HTTPBasicCredentials = Depends(security),
+) -> Generator[Session, None, None]:
+    db = get_db_router().read_session(credentials.username)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def sync_changes(db: Session = Depends(get_db)) -> None:
+    bus.poll(db)
+
+
+router = APIRouter(dependencies=[Depends(sync_changes)])
+
+
+async def verify_credentials(
+    credentials: HTTPBasicCredentials, hashed_password: str
+) -> bool:
+    login, password = credentials.username, credentials.password
+    if passwords.credential_cache.check(login, password, hashed_password):
+        return True
+    verified = await asyncio.get_running_loop().run_in_executor(
+        passwords.get_kdf_executor(),
+        passwords.verify_password,
+        password,
+        hashed_password,
+    )
+    if verified:
+        passwords.credential_cache.remember(login, password, hashed_password)
+    return verified
+
+
+async def get_current_username(
+    credentials: HTTPBasicCredentials = Depends(security),
+    db: Session = Depends(get_read_db),
+    db_write: Session = Depends(get_db),
 ) -> str:
-    hashed_password = hashlib.sha256(credentials.password.encode('utf-8')).hexdigest()
-    user = schemas.UserInDB(login=credentials.username, hashed_password=hashed_password)
-    db_user = crud.get_user_in_db(user=user, db=db)
+    db_user = await run_in_threadpool(crud.get_user, db, credentials.username)
     if db_user is None:
+        await asyncio.get_running_loop().run_in_executor(
+            passwords.get_kdf_executor(),
+            passwords.verify_password,
+            credentials.password,
+            passwords.DUMMY_HASH,
+        )
+    if db_user is None or not await verify_credentials(
+        credentials, db_user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect login or password',
             headers={'WWW-Authenticate': 'Basic'},
         )
+
+    if passwords.needs_rehash(db_user.hashed_password):
+        hashed_password = await asyncio.get_running_loop().run_in_executor(
+            passwords.get_kdf_executor(),
+            passwords.hash_password,
+            credentials.password,
+        )
+        await run_in_threadpool(
+            crud.update_user_password, db_write, credentials.username, hashed_password
+        )
+        passwords.credential_cache.remember(
+            credentials.username, credentials.password, hashed_password
+        )
     return credentials.username
 
 
-@app.post('/users/', response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)) -> models.User:
+@router.post('/users/', response_model=schemas.User)
+async def create_user(
+    user: schemas.UserCreate, db: Session = Depends(get_db)
+) -> models.User:
+    hashed_password = await asyncio.get_running_loop().run_in_executor(
+        passwords.get_kdf_executor(), passwords.hash_password, user.password
+    )
     try:
-        return crud.create_user(db=db, user=user)
+        db_user = await run_in_threadpool(crud.create_user, db, user, hashed_password)
+        get_db_router().mark_written(db_user.login)
+        return db_user
     except ValueError as e:
         logging.error(str(e))
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@app.get(
+@router.get(
     '/users/',
     response_model=List[schemas.User],
     dependencies=[Depends(get_current_username)],
 )
 def read_users(
-    skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
+    skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db)
 ) -> List[models.User]:
     return crud.get_users(db, skip, limit)
 
 
-@app.post('/users/me/reviews/', response_model=schemas.Review)
+@router.post('/users/me/reviews/', response_model=schemas.Review)
 def create_user_review(
     review: schemas.ReviewCreate,
     username: str = Depends(get_current_username),
@@ -61,6 +127,7 @@ def create_user_review(
 ) -> models.FilmReview:
     try:
         result = crud.create_user_review(db=db, username=username, film_review=review)
+        get_db_router().mark_written(username)
         logging.info('%s %s', result.user, result.film)
         return result
     except ValueError as e:
@@ -68,11 +135,11 @@ def create_user_review(
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@app.get('/users/me/reviews/{film_name}/', response_model=schemas.Review)
+@router.get('/users/me/reviews/{film_name}/', response_model=schemas.Review)
 def read_user_review(
     film_name: str,
     username: str = Depends(get_current_username),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> models.FilmReview:
     try:
         return crud.get_user_review(db, film_name=film_name, username=username)
@@ -81,93 +148,119 @@ def read_user_review(
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@app.get('/users/me/reviews/', response_model=List[schemas.Review])
+@router.get('/users/me/reviews/', response_model=List[schemas.Review])
 def read_user_reviews(
     skip: int = 0,
     limit: int = 10,
     username: str = Depends(get_current_username),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> List[models.FilmReview]:
     return crud.get_user_reviews(db, username=username, skip=skip, limit=limit)
 
 
-@app.post(
-    '/films/', response_model=schemas.Film, dependencies=[Depends(get_current_username)]
-)
-def create_film(film: schemas.FilmCreate, db: Session = Depends(get_db)) -> models.Film:
+@router.post('/films/', response_model=schemas.Film)
+def create_film(
+    film: schemas.FilmCreate,
+    username: str = Depends(get_current_username),
+    db: Session = Depends(get_db),
+) -> models.Film:
     try:
-        return crud.create_film(db, film)
+        db_film = crud.create_film(db, film, username)
+        get_db_router().mark_written(username)
+        return db_film
     except ValueError as e:
         logging.error(str(e))
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@app.get(
+@router.get(
     '/films/',
     response_model=List[schemas.Film],
     dependencies=[Depends(get_current_username)],
 )
 def read_films(
-    skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
-) -> List[models.Film]:
+    skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db)
+) -> List[crud.FilmRecord]:
     return crud.get_films(db, skip=skip, limit=limit)
 
 
-@app.get(
+@router.get(
     '/films/filter/substring/{substring}/',
     response_model=List[schemas.Film],
     dependencies=[Depends(get_current_username)],
 )
 def read_films_filtered_by_substring(
-    substring: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
+    substring: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db)
 ) -> List[models.Film]:
     return crud.get_films_filterby_substring(
         db, substring=substring, skip=skip, limit=limit
     )
 
 
-@app.get(
+@router.get(
     '/films/filter/release_year/{release_year}/',
     response_model=List[schemas.Film],
     dependencies=[Depends(get_current_username)],
 )
 def read_films_filtered_by_release_year(
-    release_year: int, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
-) -> List[models.Film]:
+    release_year: int,
+    skip: int = 0,
+    limit: int = 10,
+    db: Session = Depends(get_read_db),
+) -> List[crud.FilmRecord]:
     return crud.get_films_filterby_release_year(
         db, release_year=release_year, skip=skip, limit=limit
     )
 
 
-@app.get(
+@router.get(
+    '/films/trending/',
+    response_model=List[schemas.TrendingFilm],
+    dependencies=[Depends(get_current_username)],
+)
+def read_trending_films(
+    window: str = '24h', skip: int = 0, limit: int = 10
+) -> List[schemas.TrendingFilm]:
+    try:
+        top = trending.top(window, skip=skip, limit=limit)
+    except ValueError as e:
+        logging.error(str(e))
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return [
+        schemas.TrendingFilm(name=name, number_of_marks=count, average_mark=average)
+        for name, count, average in top
+    ]
+
+
+@router.get(
     '/films/filter/average/',
     response_model=List[schemas.Film],
     dependencies=[Depends(get_current_username)],
 )
 def read_films_filtered_by_average(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)
 ) -> List[models.Film]:
     return crud.get_films_filterby_average(db, skip=skip, limit=limit)
 
 
-@app.get(
+@router.get(
     '/films/{film_name}/reviews/',
     response_model=List[schemas.Review],
     dependencies=[Depends(get_current_username)],
 )
 def read_film_reviews(
-    film_name: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
+    film_name: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db)
 ) -> List[models.FilmReview]:
     return crud.get_film_reviews(db, film_name=film_name, skip=skip, limit=limit)
 
 
-@app.get(
+@router.get(
     '/films/{film_name}/extended/',
     response_model=schemas.FilmExtended,
     dependencies=[Depends(get_current_username)],
 )
 def read_film_extended_info(
-    film_name: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
+    film_name: str, skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db)
 ) -> schemas.FilmExtended:
     try:
         return crud.get_film_info_extended(
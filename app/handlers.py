@@ -0,0 +1,29 @@
+"""What each worker does with the changes other workers announce on the bus."""
+import json
+from typing import Optional
+
+from . import passwords
+from .catalogue import catalogue
+from .connections import get_db_router
+from .invalidation import bus
+from .trending import trending
+
+
+def on_review_created(film_name: str, payload: Optional[str]) -> None:
+    review = json.loads(payload or '{}')
+    # users who wrote through another worker read their writes from the primary
+    get_db_router().mark_written(review['login'])
+    trending.record(film_name, review['mark'], review['created_at'])
+
+
+def on_film_created(film_name: str, payload: Optional[str]) -> None:
+    film = json.loads(payload or '{}')
+    if film.get('login') is not None:
+        get_db_router().mark_written(film['login'])
+    catalogue.add(film['film_id'], film_name, film['release_year'])
+
+
+bus.subscribe('user', lambda login, _: get_db_router().mark_written(login))
+bus.subscribe('user', lambda login, _: passwords.credential_cache.forget(login))
+bus.subscribe('review', on_review_created)
+bus.subscribe('film', on_film_created)
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from . import models
+from .sharding import PRIMARY, databases_of
+
+Handler = Callable[[str, Optional[str]], None]
+
+
+class InvalidationBus:
+    """
+    Cross-worker change notifications backed by the `change_log` table.
+
+    Writers add a change record in the same transaction as the change
+    itself, so a committed change is never lost and a rolled back one is
+    never announced. Every worker process polls the log for records newer
+    than the last one it has seen and hands them to the local subscribers,
+    in commit order, exactly once per process.
+
+    With sharded reviews every shard keeps the log of its own reviews, and
+    each database is followed separately; the order holds within each.
+
+    A worker can `announce` a change it has just committed to hand it to
+    its own subscribers at once; polling then skips it.
+    """
+
+    def __init__(self, poll_interval: float = 0.0, retention: float = 86400.0):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.last_seen: Dict[str, int] = {}
+        self._last_poll = 0.0
+        self._last_prune = time.monotonic()
+        self._handlers: DefaultDict[str, List[Handler]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._announced: Set[Tuple[str, int]] = set()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers[topic].append(handler)
+
+    def publish(
+        self, db: Session, topic: str, key: str, payload: Optional[str] = None
+    ) -> models.ChangeLog:
+        change = models.ChangeLog(
+            topic=topic, key=key, payload=payload, created_at=time.time()
+        )
+        db.add(change)
+        return change
+
+    def announce(self, change: models.ChangeLog) -> None:
+        """Dispatches a committed change of this worker without waiting for a poll."""
+        name = inspect(change).identity_token or PRIMARY
+        change_id = change.change_id  # reloads the change after the commit
+        with self._lock:
+            seen = self.last_seen.get(name)
+            if seen is not None:
+                if change_id <= seen:
+                    return  # a poll got to it first
+                self._announced.add((name, change_id))
+            self._dispatch(change)
+
+    def seek(self, db: Session) -> None:
+        """Skips everything already in the log, e.g. before loading caches."""
+        for name, bind_arguments in databases_of(db).items():
+            self.last_seen[name] = self._newest(db, bind_arguments)
+
+    @staticmethod
+    def _newest(db: Session, bind_arguments: Dict[str, Any]) -> int:
+        statement = select(func.max(models.ChangeLog.change_id))
+        return db.execute(statement, bind_arguments=bind_arguments).scalar() or 0
+
+    def reset(self) -> None:
+        self.last_seen = {}
+        self._last_poll = 0.0
+        self._announced = set()
+
+    def poll(self, db: Session) -> int:
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return 0
+        # `with` can not give up on a held lock; released in the finally below
+        # pylint: disable-next=consider-using-with
+        if not self._lock.acquire(blocking=False):
+            return 0  # another thread of this worker is already polling
+        try:
+            self._last_poll = now
+            if not self.last_seen:
+                self.seek(db)
+                return 0
+
+            dispatched = sum(
+                self._poll_database(db, name, bind_arguments)
+                for name, bind_arguments in databases_of(db).items()
+            )
+
+            if now - self._last_prune >= self.retention:
+                self._last_prune = now
+                self.prune(db)
+            return dispatched
+        finally:
+            self._lock.release()
+
+    def _poll_database(
+        self, db: Session, name: str, bind_arguments: Dict[str, Any]
+    ) -> int:
+        if name not in self.last_seen:
+            self.last_seen[name] = self._newest(db, bind_arguments)
+            return 0
+        statement = (
+            select(models.ChangeLog)
+            .where(models.ChangeLog.change_id > self.last_seen[name])
+            .order_by(models.ChangeLog.change_id)
+        )
+        changes = db.execute(statement, bind_arguments=bind_arguments).scalars().all()
+        dispatched = 0
+        for change in changes:
+            if (name, change.change_id) in self._announced:
+                self._announced.discard((name, change.change_id))
+            else:
+                self._dispatch(change)
+                dispatched += 1
+            self.last_seen[name] = change.change_id
+        return dispatched
+
+    def prune(self, db: Session) -> int:
+        statement = (
+            delete(models.ChangeLog)
+            .where(models.ChangeLog.created_at < time.time() - self.retention)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = sum(
+            db.execute(statement, bind_arguments=bind_arguments).rowcount
+            for bind_arguments in databases_of(db).values()
+        )
+        db.commit()
+        return deleted
+
+    def _dispatch(self, change: models.ChangeLog) -> None:
+        for handler in self._handlers.get(change.topic, []):
+            try:
+                handler(change.key, change.payload)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Handler for %s change failed', change.topic)
+
+
+bus = InvalidationBus()
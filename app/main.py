@@ -0,0 +1,115 @@
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from sqlalchemy import inspect
+
+from . import handlers  # noqa: F401  # pylint: disable=unused-import
+from . import models
+from .admission import AdmissionController, AdmissionMiddleware, parse_limits
+from .catalogue import catalogue
+from .compression import CompressionMiddleware
+from .connections import get_db_router, get_review_shards
+from .database import add_missing_columns, begin_transaction, enable_autoincrement
+from .fastapi_app import router
+from .invalidation import bus
+from .metrics import router as metrics_router
+from .passwords import credential_cache, get_kdf_executor
+from .sharding import databases_of
+from .snapshot_api import router as snapshot_router
+from .trending import trending
+
+
+def init_paths() -> None:
+    log_dir = os.environ.get('LOG_DIR')
+    log_file = os.environ.get('LOG_FILE')
+
+    if log_dir is not None:
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+    if log_file is not None:
+        logging.basicConfig(filename=log_file)
+
+
+def init_db() -> None:
+    engine = get_db_router().engine
+    models.Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine, models.Base.metadata.sorted_tables)
+    enable_autoincrement(engine, models.ChangeLog.__table__)
+    shards = get_review_shards()
+    if shards is not None:
+        shards.create_schema()
+
+
+def on_startup() -> None:
+    if os.environ.get('CREATE_SCHEMA', '0') == '1':
+        init_db()
+
+    shards = get_review_shards()
+    if shards is not None and shards.unsharded_reviews(get_db_router().engine):
+        raise RuntimeError(
+            'The primary database still holds reviews, which are invisible '
+            'with REVIEW_SHARD_URLS set; move them with '
+            '`python -m app shard-reviews` first'
+        )
+
+    if inspect(get_db_router().engine).has_table(models.ChangeLog.__tablename__):
+        with get_db_router().write_session() as db:
+            # one snapshot per database: a change committed while loading is
+            # either in it or after the point the bus starts from, not both
+            for bind_arguments in databases_of(db).values():
+                begin_transaction(db.connection(bind_arguments=bind_arguments))
+            bus.seek(db)
+            trending.load(db)
+            if os.environ.get('CATALOGUE_INDEX', '0') == '1':
+                catalogue.load(db)
+
+
+def on_shutdown() -> None:
+    catalogue.clear()
+    get_db_router().dispose()
+    get_db_router.cache_clear()
+    shards = get_review_shards()
+    if shards is not None:
+        shards.dispose()
+    get_review_shards.cache_clear()
+    get_kdf_executor().shutdown(wait=False)
+    get_kdf_executor.cache_clear()
+
+
+def create_app() -> FastAPI:
+    """
+    Builds the application. Nothing touches the database until startup,
+    and the schema is only created there when `CREATE_SCHEMA=1`; otherwise
+    it is expected to exist (see `python -m app init-db`).
+    """
+    load_dotenv()
+    init_paths()
+
+    bus.poll_interval = float(os.environ.get('INVALIDATION_POLL_INTERVAL', 0.0))
+    bus.retention = float(os.environ.get('INVALIDATION_RETENTION', 86400.0))
+    credential_cache.ttl = float(os.environ.get('CREDENTIAL_CACHE_TTL', 300.0))
+    credential_cache.max_size = int(os.environ.get('CREDENTIAL_CACHE_SIZE', 10000))
+
+    application = FastAPI(on_startup=[on_startup], on_shutdown=[on_shutdown])
+    application.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+        level=int(os.environ.get('COMPRESSION_LEVEL', 6)),
+    )
+    controller = AdmissionController(
+        capacity=int(os.environ.get('ADMISSION_CAPACITY', 40)),
+        limits=parse_limits(os.environ.get('ADMISSION_LIMITS', '')),
+        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2.0)),
+    )
+    application.add_middleware(
+        AdmissionMiddleware,
+        controller=controller,
+        retry_after=int(os.environ.get('ADMISSION_RETRY_AFTER', 1)),
+    )
+    application.state.admission = controller
+    application.include_router(router)
+    application.include_router(snapshot_router)
+    application.include_router(metrics_router)
+    return application
@@ -0,0 +1,22 @@
+from typing import Dict
+
+from fastapi import APIRouter, Depends, Request
+
+from .database import statement_cache_stats
+from .fastapi_app import get_current_username
+
+router = APIRouter(
+    prefix='/metrics',
+    dependencies=[Depends(get_current_username)],
+    include_in_schema=False,
+)
+
+
+@router.get('/admission/')
+def admission_metrics(request: Request) -> Dict[str, Dict[str, int]]:
+    return request.app.state.admission.stats()
+
+
+@router.get('/statement-cache/')
+def statement_cache_metrics() -> Dict[str, float]:
+    return statement_cache_stats.stats()
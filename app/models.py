@@ -1,6 +1,17 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import CheckConstraint, Column, ForeignKey, Integer, String, and_, text
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    and_,
+    text,
+)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -36,6 +47,18 @@ class FilmReview(Base):
         CheckConstraint(and_(text('0 <= mark'), text('mark <= 10'))),
         nullable=False,
     )
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     film: Film = relationship('Film', back_populates='reviewers')
     user: User = relationship('User', back_populates='film_reviews')
+
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    # ids of pruned rows must not come back, workers remember the last one seen
+    __table_args__ = {'sqlite_autoincrement': True}
+    change_id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    payload = Column(String)
+    created_at = Column(Float, nullable=False, index=True)
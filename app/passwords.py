@@ -0,0 +1,124 @@
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=KEY_SIZE
+    )
+
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(SALT_SIZE)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}'
+
+
+# Checked against when the login is unknown, so that a failed login takes
+# as long whether or not the user exists
+DUMMY_HASH = (
+    f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$'
+    f'{_b64(bytes(SALT_SIZE))}${_b64(bytes(KEY_SIZE))}'
+)
+
+
+def is_legacy_hash(hashed_password: str) -> bool:
+    return not hashed_password.startswith('scrypt$')
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return is_legacy_hash(hashed_password) or not hashed_password.startswith(
+        f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$'
+    )
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    if is_legacy_hash(hashed_password):  # unsalted sha256 hex digest
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(digest, hashed_password)
+
+    try:
+        _, n, r, p, salt, key = hashed_password.split('$')
+        expected = base64.b64decode(key)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+@functools.lru_cache(maxsize=None)
+def get_kdf_executor() -> ThreadPoolExecutor:
+    """
+    A small pool of its own for KDF work: hashlib.scrypt releases the GIL,
+    and the pool size caps how many cores logins can take at once without
+    holding up the threads that serve requests.
+    """
+    workers = int(os.environ.get('KDF_WORKERS', 2))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+
+
+class CredentialCache:
+    """
+    Remembers logins whose password has recently passed the KDF check.
+
+    Only a keyed digest of the password is kept. An entry is bound to the
+    stored hash, so it stops matching as soon as the hash changes.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._key = os.urandom(32)
+        self._entries: 'OrderedDict[str, Tuple[bytes, str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._key, password.encode('utf-8'), 'sha256').digest()
+
+    def check(self, login: str, password: str, hashed_password: str) -> bool:
+        with self._lock:
+            entry: Optional[Tuple[bytes, str, float]] = self._entries.get(login)
+        if entry is None:
+            return False
+        digest, cached_hash, expires = entry
+        if expires < time.monotonic() or cached_hash != hashed_password:
+            self.forget(login)
+            return False
+        return hmac.compare_digest(digest, self._digest(password))
+
+    def remember(self, login: str, password: str, hashed_password: str) -> None:
+        entry = (self._digest(password), hashed_password, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[login] = entry
+            self._entries.move_to_end(login)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, login: str) -> None:
+        with self._lock:
+            self._entries.pop(login, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+credential_cache = CredentialCache()
@@ -41,6 +41,12 @@ class FilmExtended(FilmBase):
     reviews: List[Review] = []
 
 
+class TrendingFilm(BaseModel):
+    name: str
+    number_of_marks: int
+    average_mark: float
+
+
 class UserBase(BaseModel):
     login: str
 
@@ -49,10 +55,6 @@ class UserCreate(UserBase):
     password: str
 
 
-class UserInDB(UserBase):
-    hashed_password: str
-
-
 class User(UserBase):
     film_reviews: List[Review] = []
 
@@ -0,0 +1,250 @@
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TypeVar,
+)
+
+from sqlalchemy import and_, bindparam, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.sql.expression import StatementLambdaElement
+
+from . import models
+from .database import add_missing_columns, enable_autoincrement
+
+PRIMARY = 'primary'
+
+T = TypeVar('T')
+
+
+def _film_names(orm_context: ORMExecuteState) -> Optional[Set[str]]:
+    """
+    Film names the statement is restricted to, None if it is not. Only
+    conditions joined with AND at the top of the WHERE clause are looked at,
+    anything under an OR can not restrict the statement to a shard.
+    """
+    if isinstance(orm_context.statement, StatementLambdaElement):
+        # its bind parameters keep the values of the first call; callers that
+        # know the film pass the shard explicitly, see `film_bind_arguments`
+        return None
+    column = models.FilmReview.__table__.c.film_name
+    parameters = orm_context.parameters or {}
+    names: Optional[Set[str]] = None
+
+    def value_of(bind: Any) -> Any:
+        return parameters.get(bind.key, bind.effective_value)
+
+    clauses = [getattr(orm_context.statement, 'whereclause', None)]
+    while clauses:
+        clause = clauses.pop()
+        if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+            clauses.extend(clause.clauses)
+            continue
+        if not isinstance(clause, BinaryExpression):
+            continue
+        left, right = clause.left, clause.right
+        if not column.shares_lineage(left):
+            left, right = right, left
+        if not column.shares_lineage(left) or not isinstance(right, BindParameter):
+            continue
+        if clause.operator is operators.eq:
+            values = {value_of(right)}
+        elif clause.operator is operators.in_op:
+            values = set(value_of(right))
+        else:
+            continue
+        names = values if names is None else names & values
+    return names
+
+
+class ReviewShards:
+    """
+    Spreads `film_review` rows over several databases by a hash of the
+    film name; films, users and everything else stay on the primary. The
+    change-log record of a review is written to the review's shard, so
+    adding a review commits on that shard alone and never waits for the
+    primary's writer lock.
+
+    Sessions made by `session_maker` route each statement on their own:
+    anything restricted to some films goes to the shards owning them, other
+    review queries go to every shard. Reads that have to look at every
+    shard anyway are better done with `scatter`, which queries the shards
+    in parallel.
+    """
+
+    def __init__(self, engines: Sequence[Engine], workers: int = 0) -> None:
+        self.engines = {f'reviews{i}': engine for i, engine in enumerate(engines)}
+        self.names = list(self.engines)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or len(self.engines), thread_name_prefix='shard'
+        )
+
+    def shard_for(self, film_name: str) -> str:
+        return self.names[zlib.crc32(film_name.encode('utf-8')) % len(self.names)]
+
+    def _shard_chooser(
+        self,
+        mapper: Any,
+        instance: Any,
+        clause: Any = None,  # pylint: disable=unused-argument  # passed by name
+    ) -> str:
+        if mapper is not None and mapper.class_ is models.FilmReview:
+            return self.shard_for(instance.film_name)
+        if (
+            mapper is not None
+            and mapper.class_ is models.ChangeLog
+            and instance.topic == 'review'
+        ):
+            return self.shard_for(instance.key)
+        return PRIMARY
+
+    def _id_chooser(self, query: Any, ident: Sequence[Any]) -> List[str]:
+        if query.column_descriptions[0]['type'] is models.FilmReview:
+            return [self.shard_for(ident[1])]
+        return [PRIMARY]
+
+    def _execute_chooser(self, orm_context: ORMExecuteState) -> List[str]:
+        if any(mapper.class_ is models.ChangeLog for mapper in orm_context.all_mappers):
+            return [PRIMARY, *self.names]
+        if not any(
+            mapper.class_ is models.FilmReview for mapper in orm_context.all_mappers
+        ):
+            return [PRIMARY]
+        names = _film_names(orm_context)
+        if names is None:
+            return self.names
+        return sorted({self.shard_for(name) for name in names}) or self.names[:1]
+
+    def session_maker(self, primary: Engine) -> Callable[[], Session]:
+        return sessionmaker(
+            class_=ShardedSession,
+            shards={PRIMARY: primary, **self.engines},
+            shard_chooser=self._shard_chooser,
+            id_chooser=self._id_chooser,
+            execute_chooser=self._execute_chooser,
+            info={'review_shards': self},
+        )
+
+    def scatter(self, query: Callable[[Session], T]) -> List[T]:
+        """Runs `query` against every shard in parallel."""
+
+        def run(engine: Engine) -> T:
+            with Session(bind=engine) as db:
+                result = query(db)
+                db.expunge_all()
+                return result
+
+        return list(self.executor.map(run, self.engines.values()))
+
+    def reviews_by_login(
+        self, logins: List[str]
+    ) -> DefaultDict[str, List[models.FilmReview]]:
+        """The reviews of the users, each user's in film name order."""
+        pages = self.scatter(
+            lambda shard: (
+                shard.query(models.FilmReview).filter(
+                    models.FilmReview.login.in_(logins)
+                )
+            ).all()
+        )
+        reviews: DefaultDict[str, List[models.FilmReview]] = defaultdict(list)
+        for review in sorted(
+            (review for page in pages for review in page),
+            key=lambda review: review.film_name,
+        ):
+            reviews[review.login].append(review)
+        return reviews
+
+    def create_schema(self) -> None:
+        for engine in self.engines.values():
+            for table in (models.FilmReview.__table__, models.ChangeLog.__table__):
+                table.create(bind=engine, checkfirst=True)
+            add_missing_columns(engine, [models.FilmReview.__table__])
+            enable_autoincrement(engine, models.ChangeLog.__table__)
+
+    @staticmethod
+    def unsharded_reviews(primary: Engine) -> int:
+        """Reviews still in the primary, which sharded sessions never look at."""
+        if not inspect(primary).has_table(models.FilmReview.__tablename__):
+            return 0
+        with primary.connect() as connection:
+            return connection.execute(
+                select(func.count()).select_from(models.FilmReview.__table__)
+            ).scalar()
+
+    def move_reviews(self, primary: Engine, batch_size: int = 1000) -> int:
+        """
+        Moves the reviews from the primary to their shards. A batch is
+        deleted from the primary only after the shards have committed it,
+        and copies left by an interrupted run are skipped, so the move can
+        simply be run again.
+        """
+        table = models.FilmReview.__table__
+        delete = table.delete().where(
+            and_(
+                table.c.login == bindparam('_login'),
+                table.c.film_name == bindparam('_film_name'),
+            )
+        )
+        moved = 0
+        while True:
+            with primary.connect() as connection:
+                rows = (
+                    connection.execute(select(table).limit(batch_size)).mappings().all()
+                )
+            if not rows:
+                return moved
+
+            batches: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for row in rows:
+                batches[self.shard_for(row['film_name'])].append(dict(row))
+            for name, batch in batches.items():
+                with self.engines[name].begin() as connection:
+                    connection.execute(
+                        table.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+                        batch,
+                    )
+            with primary.begin() as connection:
+                connection.execute(
+                    delete,
+                    [
+                        {'_login': row['login'], '_film_name': row['film_name']}
+                        for row in rows
+                    ],
+                )
+            moved += len(rows)
+
+    def dispose(self) -> None:
+        self.executor.shutdown(wait=False)
+        for engine in self.engines.values():
+            engine.dispose()
+
+
+def shards_of(db: Session) -> Optional[ReviewShards]:
+    return db.info.get('review_shards')
+
+
+def film_bind_arguments(db: Session, film_name: str) -> Dict[str, Any]:
+    """The `bind_arguments` that send a statement about one film to its shard."""
+    shards = shards_of(db)
+    return {} if shards is None else {'shard_id': shards.shard_for(film_name)}
+
+
+def databases_of(db: Session) -> Dict[str, Dict[str, Any]]:
+    """The `bind_arguments` that address each database behind `db`."""
+    shards = shards_of(db)
+    if shards is None:
+        return {PRIMARY: {}}
+    return {name: {'shard_id': name} for name in [PRIMARY, *shards.names]}
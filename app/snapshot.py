@@ -0,0 +1,221 @@
+import json
+import os
+import zipfile
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import begin_transaction
+from .sharding import shards_of
+from .trending import timestamp
+
+try:  # the `arrow` extra
+    import pyarrow
+    from pyarrow import feather
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+STR, INT, TIME = 'str', 'int', 'time'
+
+# Exported columns; password hashes never leave the database
+TABLES: Dict[str, Tuple[Any, Dict[str, str]]] = {
+    'film': (models.Film, {'name': STR, 'release_year': INT}),
+    'user': (models.User, {'login': STR}),
+    'film_review': (
+        models.FilmReview,
+        {
+            'login': STR,
+            'film_name': STR,
+            'review': STR,
+            'mark': INT,
+            'created_at': TIME,
+        },
+    ),
+}
+
+# NULL in integer columns of the NumPy format; strings use -1, times NaN
+NULL_INT = -(2**63)
+
+MANIFEST = 'manifest.json'
+STRINGS = 'strings.json'
+
+Rows = Dict[str, List[Any]]
+StrPath = Union[str, 'os.PathLike[str]']
+
+
+def available_format() -> str:
+    return 'numpy' if pyarrow is None else 'arrow'
+
+
+@contextmanager
+def read_transaction(engine: Engine) -> Iterator[Connection]:
+    with engine.connect() as connection, connection.begin():
+        begin_transaction(connection)
+        yield connection
+
+
+def read_tables(primary: Engine, review_engines: Sequence[Engine]) -> Dict[str, Rows]:
+    """
+    Reads the exported columns. Every database is read in a single
+    transaction, so a concurrent write is either in the snapshot or not at
+    all; shards are separate databases and are only consistent each.
+    """
+    tables: Dict[str, Rows] = {}
+    with ExitStack() as stack:
+        connection = stack.enter_context(read_transaction(primary))
+        review_connections = [
+            connection
+            if engine is primary
+            else stack.enter_context(read_transaction(engine))
+            for engine in review_engines
+        ]
+
+        for name, (model, columns) in TABLES.items():
+            table = model.__table__
+            statement = select(*(table.c[column] for column in columns)).order_by(
+                *table.primary_key.columns
+            )
+            rows = []
+            for source in (
+                review_connections if model is models.FilmReview else [connection]
+            ):
+                rows.extend(source.execute(statement).fetchall())
+            if model is models.FilmReview and len(review_connections) > 1:
+                rows.sort(key=lambda row: (row.login, row.film_name))
+            tables[name] = {
+                column: [row[i] for row in rows] for i, column in enumerate(columns)
+            }
+    return tables
+
+
+def _write_arrow(directory: Path, tables: Dict[str, Rows]) -> None:  # pragma: no cover
+    types = {STR: pyarrow.string(), INT: pyarrow.int64(), TIME: pyarrow.timestamp('us')}
+    for name, rows in tables.items():
+        columns = TABLES[name][1]
+        table = pyarrow.table(
+            {
+                column: pyarrow.array(rows[column], types[kind])
+                for column, kind in columns.items()
+            }
+        )
+        # uncompressed Arrow IPC, so it can be memory-mapped as is
+        feather.write_feather(
+            table, directory / f'{name}.arrow', compression='uncompressed'
+        )
+
+
+def _write_numpy(directory: Path, tables: Dict[str, Rows]) -> None:
+    # one dictionary for all tables, so codes can be joined across them
+    codes: Dict[str, int] = {}
+
+    def encode(value: Optional[str]) -> int:
+        return -1 if value is None else codes.setdefault(value, len(codes))
+
+    for name, rows in tables.items():
+        for column, kind in TABLES[name][1].items():
+            values = rows[column]
+            if kind == STR:
+                array = numpy.array([encode(value) for value in values], numpy.int32)
+            elif kind == INT:
+                array = numpy.array(
+                    [NULL_INT if value is None else value for value in values],
+                    numpy.int64,
+                )
+            else:
+                array = numpy.array(
+                    [
+                        numpy.nan if value is None else timestamp(value)
+                        for value in values
+                    ],
+                    numpy.float64,
+                )
+            numpy.save(directory / f'{name}.{column}.npy', array)
+
+    with open(directory / STRINGS, 'w', encoding='utf-8') as file:
+        json.dump(list(codes), file, ensure_ascii=False)
+
+
+def write_snapshot(
+    directory: StrPath,
+    primary: Engine,
+    review_engines: Sequence[Engine] = (),
+    fmt: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Dumps films, users and reviews into `directory` in a columnar format
+    and returns its manifest. `fmt` is 'arrow' or 'numpy', by default the
+    first one installed.
+    """
+    fmt = fmt or available_format()
+    if fmt not in ('arrow', 'numpy'):
+        raise ValueError(f'Unknown snapshot format {fmt}')
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    created_at = datetime.utcnow()
+    tables = read_tables(primary, review_engines or [primary])
+
+    if fmt == 'arrow':  # pragma: no cover
+        _write_arrow(path, tables)
+    else:
+        _write_numpy(path, tables)
+
+    manifest = {
+        'format': fmt,
+        'created_at': created_at.isoformat(),
+        'tables': {
+            name: {'rows': len(next(iter(rows.values()))), 'columns': TABLES[name][1]}
+            for name, rows in tables.items()
+        },
+    }
+    with open(path / MANIFEST, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def take_snapshot(directory: StrPath, db: Session) -> Dict[str, Any]:
+    """Snapshots the databases behind `db`, shards included."""
+    shards = shards_of(db)
+    review_engines = [] if shards is None else list(shards.engines.values())
+    return write_snapshot(
+        directory, db.get_bind(models.Film.__mapper__).engine, review_engines
+    )
+
+
+def load_snapshot(directory: StrPath) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Memory-maps a snapshot. Returns the tables (Arrow tables, or dicts of
+    NumPy arrays) and the string dictionary the NumPy codes point into.
+    """
+    path = Path(directory)
+    with open(path / MANIFEST, encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    if manifest['format'] == 'arrow':  # pragma: no cover
+        return {
+            name: feather.read_table(path / f'{name}.arrow', memory_map=True)
+            for name in manifest['tables']
+        }, []
+
+    tables = {
+        name: {
+            column: numpy.load(path / f'{name}.{column}.npy', mmap_mode='r')
+            for column in table['columns']
+        }
+        for name, table in manifest['tables'].items()
+    }
+    with open(path / STRINGS, encoding='utf-8') as file:
+        strings = json.load(file)
+    return tables, strings
+
+
+def archive_snapshot(directory: StrPath, archive: StrPath) -> None:
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for file_path in sorted(Path(directory).iterdir()):
+            zip_file.write(file_path, file_path.name)
@@ -0,0 +1,39 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+
+from .fastapi_app import get_current_username, get_read_db
+
+router = APIRouter()
+
+
+@router.get(
+    '/snapshot/',
+    response_class=FileResponse,
+    dependencies=[Depends(get_current_username)],
+)
+def download_snapshot(db: Session = Depends(get_read_db)) -> FileResponse:
+    # numpy is only worth loading for snapshots, not on every worker start
+    from .snapshot import (  # pylint: disable=import-outside-toplevel
+        archive_snapshot,
+        take_snapshot,
+    )
+
+    directory = Path(tempfile.mkdtemp(prefix='snapshot'))
+    try:
+        take_snapshot(directory / 'snapshot', db)
+        archive_snapshot(directory / 'snapshot', directory / 'snapshot.zip')
+    except BaseException:
+        shutil.rmtree(directory)
+        raise
+    return FileResponse(
+        directory / 'snapshot.zip',
+        media_type='application/zip',
+        filename='snapshot.zip',
+        background=BackgroundTask(shutil.rmtree, directory),
+    )
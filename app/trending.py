@@ -0,0 +1,138 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+# window name -> (bucket length in seconds, number of buckets)
+WINDOWS = {
+    '1h': (60, 60),
+    '24h': (3600, 24),
+    '7d': (86400, 7),
+}
+
+
+def timestamp(moment: datetime) -> float:
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RollingCounter:
+    """
+    Review counts and mark sums per film over a sliding window, kept in a
+    ring of buckets. Moving the window on only drops the buckets that fell
+    out of it. The ranking is kept sorted as reviews come in, each moving
+    one film, and is rebuilt only once a bucket expires, so reading a page
+    of it is O(limit).
+    """
+
+    def __init__(self, bucket_seconds: int, buckets: int) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.buckets: List[Dict[str, List[int]]] = [{} for _ in range(buckets)]
+        self.current: Optional[int] = None  # number of the newest bucket
+        self.totals: Dict[str, List[int]] = {}
+        self._ranking: Optional[List[Tuple[int, float, str]]] = None
+
+    def advance(self, now: float) -> None:
+        newest = int(now // self.bucket_seconds)
+        if self.current is None:
+            self.current = newest
+        if newest <= self.current:
+            return
+        for number in range(
+            max(self.current + 1, newest - len(self.buckets) + 1), newest + 1
+        ):
+            self._expire(self.buckets[number % len(self.buckets)])
+        self.current = newest
+
+    def _expire(self, bucket: Dict[str, List[int]]) -> None:
+        for film_name, (count, marks) in bucket.items():
+            total = self.totals[film_name]
+            total[0] -= count
+            total[1] -= marks
+            if total[0] == 0:
+                del self.totals[film_name]
+        if bucket:
+            bucket.clear()
+            self._ranking = None
+
+    def _key(self, film_name: str) -> Tuple[int, float, str]:
+        count, marks = self.totals[film_name]
+        return (-count, -marks / count, film_name)
+
+    def add(self, film_name: str, mark: int, moment: float) -> None:
+        number = int(moment // self.bucket_seconds)
+        self.advance(moment)
+        if self.current is None or number <= self.current - len(self.buckets):
+            return  # already out of the window
+        ranking = self._ranking
+        if ranking is not None and film_name in self.totals:
+            del ranking[bisect.bisect_left(ranking, self._key(film_name))]
+        bucket = self.buckets[number % len(self.buckets)]
+        for counts in (bucket, self.totals):
+            entry = counts.setdefault(film_name, [0, 0])
+            entry[0] += 1
+            entry[1] += mark
+        if ranking is not None:
+            bisect.insort(ranking, self._key(film_name))
+
+    def top(self, skip: int, limit: int) -> List[Tuple[str, int, float]]:
+        if self._ranking is None:
+            self._ranking = sorted(self._key(name) for name in self.totals)
+        page = []
+        for *_, name in self._ranking[skip : skip + limit]:
+            count, marks = self.totals[name]
+            page.append((name, count, marks / count))
+        return page
+
+
+class TrendingIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, RollingCounter] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counters = {
+                window: RollingCounter(*bucketing)
+                for window, bucketing in WINDOWS.items()
+            }
+
+    def record(self, film_name: str, mark: int, moment: float) -> None:
+        with self._lock:
+            for counter in self.counters.values():
+                counter.add(film_name, mark, moment)
+
+    def top(
+        self, window: str, skip: int = 0, limit: int = 10
+    ) -> List[Tuple[str, int, float]]:
+        if window not in self.counters:
+            raise ValueError(
+                f'Unknown window {window}, expected one of {", ".join(WINDOWS)}'
+            )
+        with self._lock:
+            counter = self.counters[window]
+            counter.advance(time.time())
+            return counter.top(skip, limit)
+
+    def load(self, db: Session) -> None:
+        """Fills the counters with the reviews of the longest window."""
+        longest = max(seconds * buckets for seconds, buckets in WINDOWS.values())
+        since = datetime.utcfromtimestamp(time.time() - longest)
+        reviews = (
+            db.query(
+                models.FilmReview.film_name,
+                models.FilmReview.mark,
+                models.FilmReview.created_at,
+            ).filter(models.FilmReview.created_at >= since)
+        ).all()
+        self.clear()
+        for film_name, mark, created_at in sorted(reviews, key=lambda r: r[2]):
+            self.record(film_name, mark, timestamp(created_at))
+
+
+trending = TrendingIndex()
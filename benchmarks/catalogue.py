@@ -0,0 +1,73 @@
+"""
+Film existence checks and release-year filters answered by SQL against the
+in-memory catalogue index, and the memory the index takes per film.
+
+Run with `python -m benchmarks.catalogue`.
+"""
+import sys
+import timeit
+import tracemalloc
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.catalogue import CatalogueIndex, catalogue
+from app.database import make_engine
+
+FILMS = 10000
+REPEAT = 2000
+
+
+def fill(db: Session) -> None:
+    db.add_all(
+        models.Film(name=f'film_{i}', release_year=1950 + i % 70) for i in range(FILMS)
+    )
+    db.commit()
+
+
+def measure(db: Session) -> List[float]:
+    counter = iter(range(REPEAT * 4))
+    cases = [
+        lambda: crud.film_exists(db, f'film_{next(counter) % FILMS}'),
+        lambda: crud.get_films_filterby_release_year(
+            db, 1950 + next(counter) % 70, skip=50, limit=10
+        ),
+    ]
+    timings = []
+    for case in cases:
+        seconds = timeit.timeit(case, number=REPEAT)
+        db.expunge_all()
+        timings.append(seconds / REPEAT * 1e6)
+    return timings
+
+
+def main() -> None:
+    engine = make_engine('sqlite://')
+    models.Base.metadata.create_all(bind=engine)
+    db = Session(bind=engine)
+    fill(db)
+
+    sql = measure(db)
+    catalogue.load(db)
+    indexed = measure(db)
+    catalogue.clear()
+
+    print(f'{"function":<26}{"sql, us":>10}{"index, us":>11}')
+    for name, before, after in zip(
+        ('film_exists', 'filterby_release_year'), sql, indexed
+    ):
+        print(f'{name:<26}{before:>10.1f}{after:>11.1f}')
+
+    # intern the names beforehand, so that only the index itself is counted
+    names = [sys.intern(f'film_{i}') for i in range(FILMS)]
+    tracemalloc.start()
+    index = CatalogueIndex()
+    index.load(db)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{size / FILMS:.0f} bytes per film beyond the {len(names)} names')
+
+
+if __name__ == '__main__':
+    main()
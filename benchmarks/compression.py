@@ -0,0 +1,60 @@
+"""
+CPU/egress trade-off of response compression on typical portal pages.
+
+Run with `python -m benchmarks.compression`.
+"""
+import json
+import timeit
+from typing import Dict
+
+from app.compression import available_encodings
+
+REPEAT = 200
+
+
+def make_pages() -> Dict[str, bytes]:
+    films = [
+        {'name': f'film_{i:04d}', 'release_year': 1950 + i % 70} for i in range(100)
+    ]
+    reviews = [
+        {
+            'film_name': f'film_{i:04d}',
+            'review': f'Review number {i}, quite a good film overall',
+            'mark': i % 11,
+            'login': f'user_{i % 10}',
+        }
+        for i in range(100)
+    ]
+    users = [
+        {'login': f'user_{i}', 'film_reviews': reviews[i * 10 : i * 10 + 10]}
+        for i in range(10)
+    ]
+    pages: Dict[str, object] = {
+        'film reviews (limit=10)': reviews[:10],
+        'average (limit=100)': films,
+        'users (limit=10)': users,
+    }
+    return {
+        name: json.dumps(page, separators=(',', ':')).encode()
+        for name, page in pages.items()
+    }
+
+
+def main() -> None:
+    print(
+        f'{"page":<26}{"encoding":<10}{"level":>6}{"bytes":>9}{"ratio":>8}{"us/op":>9}'
+    )
+    for name, body in make_pages().items():
+        print(f'{name:<26}{"identity":<10}{"-":>6}{len(body):>9}{1:>8.2f}{0:>9.1f}')
+        for encoding, compress in available_encodings().items():
+            for level in (1, 6, 9):
+                size = len(compress(body, level))
+                seconds = timeit.timeit(lambda: compress(body, level), number=REPEAT)
+                print(
+                    f'{name:<26}{encoding:<10}{level:>6}{size:>9}'
+                    f'{size / len(body):>8.2f}{seconds / REPEAT * 1e6:>9.1f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
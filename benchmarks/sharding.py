@@ -0,0 +1,98 @@
+"""
+Review write throughput with the reviews kept in the primary database
+versus spread over several shards. Reviews go through
+`crud.create_user_review`, change-log record included, from several
+processes at once, as with `POST /users/me/reviews/` served by one worker
+per core.
+
+Sharding only pays off when the writers wait on each other's locks, not
+on a shared CPU, so the numbers mean little on fewer cores than PROCESSES.
+
+Run with `python -m benchmarks.sharding`.
+"""
+import functools
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+from typing import Callable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.database import make_engine
+from app.sharding import ReviewShards
+
+PROCESSES = 4
+USERS = 40
+FILMS = 50  # every user reviews every film once
+
+
+def fill(url: str) -> None:
+    engine = make_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        db.add_all(
+            models.User(login=f'user_{i}', hashed_password='-') for i in range(USERS)
+        )
+        db.add_all(models.Film(name=f'film_{i}') for i in range(FILMS))
+        db.commit()
+    engine.dispose()
+
+
+def write(job: Tuple[str, List[str], List[int]]) -> None:
+    primary_url, shard_urls, users = job
+    primary = make_engine(primary_url)
+    shards = None
+    make_session: Callable[[], Session] = functools.partial(Session, bind=primary)
+    if shard_urls:
+        shards = ReviewShards([make_engine(url) for url in shard_urls])
+        make_session = shards.session_maker(primary)
+
+    for user in users:
+        for film in range(FILMS):
+            with make_session() as db:
+                crud.create_user_review(
+                    db,
+                    f'user_{user}',
+                    schemas.ReviewCreate(film_name=f'film_{film}', mark=5),
+                )
+
+    if shards is not None:
+        shards.dispose()
+    primary.dispose()
+
+
+def measure(directory: str, shard_count: int) -> float:
+    primary_url = f'sqlite:///{directory}/primary{shard_count}.db'
+    fill(primary_url)
+    shard_urls = [
+        f'sqlite:///{directory}/s{shard_count}_{i}.db' for i in range(shard_count)
+    ]
+    if shard_urls:
+        shards = ReviewShards([make_engine(url) for url in shard_urls])
+        shards.create_schema()
+        shards.dispose()
+
+    jobs = [
+        (primary_url, shard_urls, list(range(USERS))[i::PROCESSES])
+        for i in range(PROCESSES)
+    ]
+    with Pool(PROCESSES) as pool:
+        start = time.perf_counter()
+        pool.map(write, jobs)
+        seconds = time.perf_counter() - start
+    return USERS * FILMS / seconds
+
+
+def main() -> None:
+    print(f'{PROCESSES} writer processes on {os.cpu_count()} core(s)')
+    with tempfile.TemporaryDirectory() as directory:
+        for shard_count in (0, 1, 2, 4):
+            rate = measure(directory, shard_count)
+            label = f'{shard_count} shard(s)' if shard_count else 'no sharding'
+            print(f'{label}: {rate:.0f} reviews/s')
+
+
+if __name__ == '__main__':
+    main()
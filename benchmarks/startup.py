@@ -0,0 +1,76 @@
+"""
+Cold start time of a worker: a fresh interpreter importing and building the
+app and running its startup hooks, with and without schema creation.
+
+The `import-time DDL` row replays what every worker did before the app
+factory: load .env, set up logging and create the schema while the package
+was imported, whatever CREATE_SCHEMA says.
+
+Run with `python -m benchmarks.startup`.
+"""
+import os
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+from typing import Dict
+
+REPEAT = 10
+
+SNIPPET = '''
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import create_app
+with TestClient(create_app()):
+    pass
+print(time.perf_counter() - start)
+'''
+
+IMPORT_TIME_DDL_SNIPPET = '''
+import time
+start = time.perf_counter()
+from dotenv import load_dotenv
+from fastapi.testclient import TestClient
+from app.main import create_app, init_db, init_paths
+load_dotenv()
+init_paths()
+init_db()
+with TestClient(create_app()):
+    pass
+print(time.perf_counter() - start)
+'''
+
+
+def measure(env: Dict[str, str], snippet: str = SNIPPET) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        output = subprocess.run(  # nosec
+            [sys.executable, '-c', snippet],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        timings.append(float(output))
+    return statistics.median(timings)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            SQLALCHEMY_DATABASE_URL=f'sqlite:///{directory}/portal.db',
+        )
+        subprocess.run(  # nosec
+            [sys.executable, '-m', 'app', 'init-db'], env=env, check=True
+        )
+        seconds = measure(dict(env, CREATE_SCHEMA='0'), IMPORT_TIME_DDL_SNIPPET)
+        print(f'import-time DDL: {seconds * 1000:.1f} ms')
+        for create_schema in ('0', '1'):
+            seconds = measure(dict(env, CREATE_SCHEMA=create_schema))
+            print(f'CREATE_SCHEMA={create_schema}: {seconds * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
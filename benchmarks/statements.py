@@ -0,0 +1,85 @@
+"""
+Per-call latency of the CRUD hot paths: the former `db.query(...)` chains
+against the cached lambda statements now used in `app.crud`.
+
+Run with `python -m benchmarks.statements`.
+"""
+import timeit
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.database import make_engine, statement_cache_stats
+
+REPEAT = 2000
+
+
+def query_get_user(db: Session, login: str) -> models.User:
+    return db.query(models.User).filter(models.User.login == login).first()
+
+
+def query_get_films(db: Session, skip: int, limit: int) -> List[models.Film]:
+    return db.query(models.Film).offset(skip).limit(limit).all()
+
+
+def query_get_film_reviews(
+    db: Session, film_name: str, skip: int, limit: int
+) -> List[models.FilmReview]:
+    return (
+        db.query(models.FilmReview)
+        .filter(models.FilmReview.film_name == film_name)
+        .offset(skip)
+        .limit(limit)
+    ).all()
+
+
+def fill(db: Session) -> None:
+    for i in range(100):
+        db.add(models.User(login=f'user_{i}', hashed_password='-'))
+        db.add(models.Film(name=f'film_{i}', release_year=2000 + i % 20))
+    for i in range(1000):
+        db.add(
+            models.FilmReview(
+                login=f'user_{i % 100}', film_name=f'film_{i // 10}', mark=i % 11
+            )
+        )
+    db.commit()
+
+
+def main() -> None:
+    engine = make_engine('sqlite://')
+    models.Base.metadata.create_all(bind=engine)
+    db = Session(bind=engine)
+    fill(db)
+
+    cases: Dict[str, List[Callable[[int], object]]] = {
+        'get_user': [
+            lambda i: query_get_user(db, f'user_{i % 100}'),
+            lambda i: crud.get_user(db, f'user_{i % 100}'),
+        ],
+        'get_films': [
+            lambda i: query_get_films(db, i % 90, 10),
+            lambda i: crud.get_films(db, i % 90, 10),
+        ],
+        'get_film_reviews': [
+            lambda i: query_get_film_reviews(db, f'film_{i % 100}', 0, 10),
+            lambda i: crud.get_film_reviews(db, f'film_{i % 100}', 0, 10),
+        ],
+    }
+
+    print(f'{"function":<18}{"query, us":>11}{"lambda, us":>12}{"hit rate":>10}')
+    for name, (query, cached) in cases.items():
+        timings = []
+        for function in (query, cached):
+            statement_cache_stats.reset()
+            counter = iter(range(REPEAT * 2))
+            seconds = timeit.timeit(lambda: function(next(counter)), number=REPEAT)
+            db.expunge_all()
+            timings.append(seconds / REPEAT * 1e6)
+        hit_rate = statement_cache_stats.stats()['hit_rate']
+        print(f'{name:<18}{timings[0]:>11.1f}{timings[1]:>12.1f}{hit_rate:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,12 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.fastapi_app import app, get_current_username, get_db
+from app.catalogue import catalogue
+from app.fastapi_app import get_current_username, get_db, get_read_db
+from app.invalidation import bus
+from app.main import create_app
 from app.models import Base
+from app.trending import trending
 
 users = [
     {'login': 'test_user', 'password': 'test_password'},
@@ -47,6 +51,7 @@ def init_db():
 
 
 TestingSessionLocal, engine = init_db()
+app = create_app()
 
 
 def overriden_get_db():
@@ -64,6 +69,9 @@ def setup():
     log_file = os.environ.get('TEST_LOG_FILE')
     logging.basicConfig(filename=log_file, level=logging.INFO, force=True)
     Base.metadata.create_all(bind=engine)
+    bus.reset()
+    trending.clear()
+    catalogue.clear()
 
     yield
 
@@ -81,6 +89,7 @@ def teardown_session():
 @pytest.fixture(name='client')
 def client_() -> TestClient:
     app.dependency_overrides[get_db] = overriden_get_db
+    app.dependency_overrides[get_read_db] = overriden_get_db
     app.dependency_overrides[get_current_username] = lambda: 'test_user'
     return TestClient(app)
 
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.admission import (
+    CHEAP,
+    EXPENSIVE,
+    REGISTER,
+    WRITE,
+    AdmissionController,
+    AdmissionMiddleware,
+    ClassLimit,
+    classify,
+    parse_limits,
+)
+from app.main import create_app
+
+
+@pytest.mark.parametrize(
+    ('method', 'path', 'expected'),
+    [
+        ('POST', '/users/', REGISTER),
+        ('POST', '/users/me/reviews/', WRITE),
+        ('GET', '/users/', EXPENSIVE),
+        ('GET', '/films/filter/average/', EXPENSIVE),
+        ('GET', '/users/me/reviews/test_film/', CHEAP),
+        ('GET', '/films/', CHEAP),
+    ],
+)
+def test_classify(method, path, expected):
+    assert classify(method, path) == expected
+
+
+def test_parse_limits():
+    assert parse_limits('write=16:64, expensive=2,') == {
+        WRITE: ClassLimit(16, 64),
+        EXPENSIVE: ClassLimit(2, 0),
+    }
+
+
+def test_class_limit_and_queue():
+    async def scenario():
+        controller = AdmissionController(
+            capacity=10, limits={EXPENSIVE: ClassLimit(1, 1)}, queue_timeout=0.01
+        )
+        assert await controller.acquire(EXPENSIVE)
+        assert await controller.acquire(CHEAP)  # other classes are not blocked
+        assert not await controller.acquire(EXPENSIVE)  # timed out in the queue
+
+        waiting = asyncio.ensure_future(controller.acquire(EXPENSIVE))
+        await asyncio.sleep(0)
+        assert controller.stats()[EXPENSIVE]['queued'] == 1
+        assert not await controller.acquire(EXPENSIVE)  # the queue is full
+
+        controller.release(EXPENSIVE)
+        assert await waiting
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats[EXPENSIVE] == {
+        'active': 1,
+        'queued': 0,
+        'max_concurrency': 1,
+        'max_queue': 1,
+        'admitted': 2,
+        'rejected': 2,
+    }
+    assert stats[CHEAP]['active'] == 1
+
+
+def test_writes_are_served_before_expensive_reads_and_registrations():
+    async def scenario():
+        controller = AdmissionController(
+            capacity=1,
+            limits={EXPENSIVE: ClassLimit(1, 1), REGISTER: ClassLimit(1, 1)},
+            queue_timeout=1,
+        )
+        order = []
+
+        async def request(route_class):
+            assert await controller.acquire(route_class)
+            order.append(route_class)
+
+        assert await controller.acquire(CHEAP)
+        waiting = [
+            asyncio.ensure_future(request(route_class))
+            for route_class in (REGISTER, EXPENSIVE, CHEAP, WRITE)
+        ]
+        await asyncio.sleep(0)
+        for route_class in (CHEAP, WRITE, CHEAP, EXPENSIVE):
+            controller.release(route_class)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiting)
+        return order
+
+    assert asyncio.run(scenario()) == [WRITE, CHEAP, EXPENSIVE, REGISTER]
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = AdmissionController(capacity=1, queue_timeout=1)
+        await controller.acquire(CHEAP)
+        waiting = asyncio.ensure_future(controller.acquire(CHEAP))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        return controller.stats()[CHEAP]
+
+    assert asyncio.run(scenario())['queued'] == 0
+
+
+def test_middleware_sheds_load():
+    controller = AdmissionController(capacity=4, limits={EXPENSIVE: ClassLimit(0, 0)})
+    test_app = FastAPI()
+    test_app.add_middleware(AdmissionMiddleware, controller=controller, retry_after=3)
+
+    @test_app.get('/users/')
+    def users() -> list:
+        return []
+
+    @test_app.get('/films/')
+    def films() -> list:
+        return []
+
+    client = TestClient(test_app)
+
+    response = client.get('/users/')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '3'
+
+    assert client.get('/films/').status_code == 200
+    assert controller.stats()[CHEAP]['active'] == 0
+
+
+def test_admission_metrics(client: TestClient):
+    response = client.get('/metrics/admission/')
+
+    assert response.status_code == 200
+    assert response.json()[CHEAP]['active'] == 1
+
+
+@pytest.mark.parametrize('url', ['/metrics/admission/', '/metrics/statement-cache/'])
+def test_metrics_need_credentials(url):
+    response = TestClient(create_app()).get(url)
+
+    assert response.status_code == 401
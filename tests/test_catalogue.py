@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from app import crud, models, schemas
+from app.catalogue import CatalogueIndex, catalogue
+from app.invalidation import bus
+from tests.conftest import TestingSessionLocal, films
+
+
+@pytest.fixture(name='index')
+def index_() -> CatalogueIndex:
+    index = CatalogueIndex()
+    with TestingSessionLocal() as db:
+        db.add_all(models.Film(**film) for film in films)
+        db.commit()
+        index.load(db)
+    return index
+
+
+def names(entries):
+    return [entry.name for entry in entries]
+
+
+def test_load(index):
+    assert index.get('test_film').release_year == 2019
+    assert index.get('missing') is None
+    assert names(index.page(1, 2)) == ['testie__film2', 't_est_film3']
+    assert names(index.filter_by_year(2019, 0, 10)) == ['test_film', 'testie__film2']
+    assert names(index.filter_by_year(2019, 1, 10)) == ['testie__film2']
+    assert index.filter_by_year(1900, 0, 10) == []
+
+
+def test_add(index):
+    index.add(10, 'new_film', 2019)
+    index.add(10, 'new_film', 2019)
+    index.add(11, 'no_year', None)
+
+    assert names(index.filter_by_year(2019, 0, 10)) == [
+        'test_film',
+        'testie__film2',
+        'new_film',
+    ]
+    assert names(index.page(5, 10)) == ['new_film', 'no_year']
+
+
+def test_add_out_of_order(index):
+    index.add(10, 'late_film', 2016)
+    index.add(7, 'early_film', 2016)
+
+    assert names(index.filter_by_year(2016, 0, 10)) == [
+        't_est_film3',
+        'early_film',
+        'late_film',
+    ]
+
+
+def test_add_before_load_is_ignored():
+    index = CatalogueIndex()
+    index.add(1, 'test_film', 2019)
+
+    assert index.get('test_film') is None
+
+
+@pytest.mark.parametrize(
+    'url',
+    [
+        '/films/',
+        '/films/?skip=2&limit=2',
+        '/films/filter/release_year/2019/',
+        '/films/filter/release_year/2019/?skip=1',
+        '/films/filter/release_year/1900/',
+    ],
+)
+def test_answers_match_database(client_w_many_reviews, url):
+    expected = client_w_many_reviews.get(url).json()
+    with TestingSessionLocal() as db:
+        catalogue.load(db)
+
+    assert client_w_many_reviews.get(url).json() == expected
+
+
+def test_create_film_updates_catalogue(client_w_user):
+    with TestingSessionLocal() as db:
+        catalogue.load(db)
+
+    client_w_user.post('/films/', json={'name': 'test_film', 'release_year': 2019})
+    response = client_w_user.post(
+        '/users/me/reviews/', json={'film_name': 'test_film', 'mark': 8}
+    )
+
+    assert response.status_code == 200
+    assert catalogue.get('test_film') is not None
+    response = client_w_user.get('/films/filter/release_year/2019/')
+    assert [film['name'] for film in response.json()] == ['test_film']
+
+
+def test_film_from_another_worker(client_w_user, monkeypatch):
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+    client_w_user.get('/films/')  # the bus starts from here
+    with TestingSessionLocal() as db:
+        catalogue.load(db)
+        # as if another worker created it
+        db_film = models.Film(name='other_film', release_year=2020)
+        db.add(db_film)
+        db.flush()
+        payload = {'film_id': db_film.film_id, 'release_year': 2020}
+        bus.publish(db, 'film', 'other_film', json.dumps(payload))
+        db.commit()
+
+        # a miss is checked against the database before the bus delivers it
+        assert crud.get_user_review(db, 'other_film', 'test_user') is None
+        with pytest.raises(ValueError):
+            crud.create_film(db, schemas.FilmCreate(name='other_film'))
+
+    response = client_w_user.get('/films/filter/release_year/2020/')
+    assert [film['name'] for film in response.json()] == ['other_film']
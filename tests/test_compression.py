@@ -0,0 +1,87 @@
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, negotiate_encoding
+
+
+@pytest.mark.parametrize(
+    ('header', 'expected'),
+    [
+        ('gzip, deflate', 'gzip'),
+        ('br;q=1.0, gzip;q=0.5', 'gzip'),
+        ('gzip;q=0', None),
+        ('*', 'gzip'),
+        ('*;q=0.1, gzip;q=0', None),
+        ('identity', None),
+        ('', None),
+        ('gzip;q=abc', None),
+    ],
+)
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ['gzip']) == expected
+
+
+def test_negotiate_encoding_prefers_weight_then_server_order():
+    assert negotiate_encoding('gzip, br', ['zstd', 'br', 'gzip']) == 'br'
+    assert negotiate_encoding('gzip;q=1, br;q=0.5', ['br', 'gzip']) == 'gzip'
+
+
+@pytest.fixture(name='compressed_client')
+def compressed_client_() -> TestClient:
+    test_app = FastAPI()
+    test_app.add_middleware(CompressionMiddleware, minimum_size=100, level=9)
+
+    @test_app.get('/small/')
+    def small() -> dict:
+        return {'data': 'x'}
+
+    @test_app.get('/large/')
+    def large() -> dict:
+        return {'data': 'x' * 1000}
+
+    @test_app.get('/archive/')
+    def archive() -> Response:
+        return Response(b'x' * 1000, media_type='application/zip')
+
+    return TestClient(test_app)
+
+
+def test_large_response_is_compressed(compressed_client: TestClient):
+    response = compressed_client.get('/large/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert int(response.headers['content-length']) < 1000
+    assert response.json() == {'data': 'x' * 1000}
+
+
+def test_small_response_is_not_compressed(compressed_client: TestClient):
+    response = compressed_client.get('/small/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert response.json() == {'data': 'x'}
+
+
+def test_identity_is_not_compressed(compressed_client: TestClient):
+    response = compressed_client.get('/large/', headers={'Accept-Encoding': 'identity'})
+
+    assert 'content-encoding' not in response.headers
+    assert response.json() == {'data': 'x' * 1000}
+
+
+def test_compressed_types_are_passed_through(compressed_client: TestClient):
+    response = compressed_client.get('/archive/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'content-encoding' not in response.headers
+    assert response.content == b'x' * 1000
+
+
+def test_app_compresses_large_pages(client_w_many_reviews: TestClient):
+    response = client_w_many_reviews.get('/users/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert len(response.json()) == 3
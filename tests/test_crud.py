@@ -1,22 +1,76 @@
-import hashlib
+import pytest
+from sqlalchemy import event
 
-from app import crud, schemas
-from tests.conftest import overriden_get_db
+from app import crud, passwords, schemas
+from app.database import StatementCacheStats
+from tests.conftest import engine, overriden_get_db
 
 
-def test_get_user_in_db():
+def test_get_user():
     login = 'user'
     password = 'topsecret'
     user_schema = schemas.UserCreate(login=login, password=password)
     db = next(overriden_get_db())
-    crud.create_user(db, user_schema)
-
-    hashed_password = hashlib.sha256(password.encode('utf-8')).hexdigest()
-
-    user_in_db_schema = schemas.UserInDB(login='user', hashed_password=hashed_password)
+    crud.create_user(db, user_schema, passwords.hash_password(password))
 
     db = next(overriden_get_db())
-    user = crud.get_user_in_db(db, user_in_db_schema)
+    user = crud.get_user(db, login)
 
     assert user is not None
     assert user.login == login
+    assert not passwords.is_legacy_hash(user.hashed_password)
+    assert passwords.verify_password(password, user.hashed_password)
+    assert crud.get_user(db, 'nonexistent_user') is None
+
+
+def test_update_user_password():
+    db = next(overriden_get_db())
+    crud.create_user(
+        db,
+        schemas.UserCreate(login='user', password='topsecret'),
+        passwords.hash_password('topsecret'),
+    )
+
+    crud.update_user_password(db, 'user', 'new_hash')
+
+    db = next(overriden_get_db())
+    assert crud.get_user(db, 'user').hashed_password == 'new_hash'
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_cached_statements_use_current_parameters():
+    db = next(overriden_get_db())
+
+    assert [film.name for film in crud.get_films(db, skip=1, limit=2)] == [
+        'testie__film2',
+        't_est_film3',
+    ]
+    assert [film.name for film in crud.get_films(db, skip=3, limit=10)] == [
+        'te__st_film4',
+        'telsfilm5',
+    ]
+    assert [r.login for r in crud.get_film_reviews(db, 'test_film', limit=1)] == [
+        'test_user'
+    ]
+    assert [r.mark for r in crud.get_film_reviews(db, 'te__st_film4', skip=1)] == [
+        4,
+        5,
+    ]
+    assert crud.get_user(db, 'p_user').login == 'p_user'
+    assert crud.get_user(db, 'not_test_user').login == 'not_test_user'
+
+
+def test_statement_cache_is_hit():
+    stats = StatementCacheStats()
+    event.listen(engine, 'after_cursor_execute', stats.record)
+    try:
+        db = next(overriden_get_db())
+        for film_name in ('film1', 'film2', 'film3'):
+            crud.get_film_reviews(db, film_name)
+    finally:
+        event.remove(engine, 'after_cursor_execute', stats.record)
+
+    assert stats.stats()['hits'] >= 2
+    assert stats.stats()['hit_rate'] >= 2 / 3
+    stats.reset()
+    assert stats.stats() == {'hits': 0, 'misses': 0, 'uncached': 0, 'hit_rate': 0.0}
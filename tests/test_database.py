@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+from fastapi.security import HTTPBasicCredentials
+
+from app import fastapi_app, handlers
+from app.database import DatabaseRouter, make_engine
+from tests.conftest import engine
+
+
+def make_replica(path):
+    # A local copy of the primary plays the role of a replica
+    with engine.connect() as connection:
+        source = connection.connection.connection
+        target = sqlite3.connect(path)
+        source.backup(target)
+        target.close()
+    return make_engine(f'sqlite:///{path}')
+
+
+@pytest.fixture(name='replicas')
+def replicas_(tmp_path):
+    engines = [make_replica(tmp_path / f'replica{i}.db') for i in range(2)]
+    yield engines
+    for replica in engines:
+        replica.dispose()
+
+
+def test_reads_without_replicas_go_to_primary():
+    router = DatabaseRouter(engine)
+
+    assert router.read_session('user').get_bind() is engine
+    assert router.write_session().get_bind() is engine
+
+
+def test_reads_are_spread_over_replicas(replicas):
+    router = DatabaseRouter(engine, replicas)
+
+    binds = [router.read_session().get_bind() for _ in range(4)]
+
+    assert binds == replicas * 2
+
+
+def test_read_your_writes(replicas):
+    router = DatabaseRouter(engine, replicas, sticky_seconds=60)
+    router.mark_written('writer')
+
+    assert router.read_session('writer').get_bind() is engine
+    assert router.read_session('reader').get_bind() in replicas
+    assert router.read_session().get_bind() in replicas
+
+
+def test_stickiness_expires(replicas):
+    router = DatabaseRouter(engine, replicas, sticky_seconds=0)
+    router.mark_written('writer')
+    router.mark_written('other')
+
+    assert not router.is_sticky('writer')
+    assert router.read_session('writer').get_bind() in replicas
+
+
+def test_get_read_db_uses_router(monkeypatch, replicas):
+    router = DatabaseRouter(engine, replicas[:1])
+    router.mark_written('writer')
+    monkeypatch.setattr(fastapi_app, 'get_db_router', lambda: router)
+
+    reader = fastapi_app.get_read_db(HTTPBasicCredentials(username='u', password='p'))
+    writer = fastapi_app.get_read_db(
+        HTTPBasicCredentials(username='writer', password='p')
+    )
+
+    assert next(reader).get_bind() is replicas[0]
+    assert next(writer).get_bind() is engine
+
+
+def test_writes_through_other_workers_are_sticky(monkeypatch, replicas):
+    router = DatabaseRouter(engine, replicas[:1])
+    monkeypatch.setattr(handlers, 'get_db_router', lambda: router)
+
+    handlers.on_film_created(
+        'test_film', '{"film_id": 1, "release_year": 2019, "login": "writer"}'
+    )
+    handlers.on_review_created(
+        'test_film', '{"login": "reviewer", "mark": 8, "created_at": 0}'
+    )
+
+    assert router.is_sticky('writer')
+    assert router.is_sticky('reviewer')
+    assert not router.is_sticky('reader')
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+from sqlalchemy import inspect
+
+from app import models
+from app.database import enable_autoincrement, make_engine
+from app.invalidation import InvalidationBus, bus
+from tests.conftest import overriden_get_db
+
+
+def test_poll_dispatches_committed_changes_once():
+    received = []
+    test_bus = InvalidationBus()
+    test_bus.subscribe('film', lambda key, payload: received.append((key, payload)))
+    db = next(overriden_get_db())
+
+    assert test_bus.poll(db) == 0  # the first poll only remembers the position
+
+    test_bus.publish(db, 'film', 'uncommitted')
+    db.rollback()
+    test_bus.publish(db, 'film', 'test_film', 'payload')
+    test_bus.publish(db, 'user', 'test_user')
+    db.commit()
+
+    assert test_bus.poll(db) == 2
+    assert received == [('test_film', 'payload')]
+    assert test_bus.poll(db) == 0
+    assert received == [('test_film', 'payload')]
+
+
+def test_workers_see_changes_of_each_other():
+    worker_a, worker_b = InvalidationBus(), InvalidationBus()
+    received = []
+    worker_b.subscribe('film', lambda key, _: received.append(key))
+    db = next(overriden_get_db())
+    worker_a.poll(db)
+    worker_b.poll(db)
+
+    worker_a.publish(db, 'film', 'test_film')
+    db.commit()
+    worker_b.poll(next(overriden_get_db()))
+
+    assert received == ['test_film']
+
+
+def test_failing_handler_does_not_stop_dispatch():
+    received = []
+    test_bus = InvalidationBus()
+    test_bus.subscribe('film', lambda key, _: 1 / 0)
+    test_bus.subscribe('film', lambda key, _: received.append(key))
+    db = next(overriden_get_db())
+    test_bus.seek(db)
+    test_bus.publish(db, 'film', 'test_film')
+    db.commit()
+
+    assert test_bus.poll(db) == 1
+    assert received == ['test_film']
+    assert test_bus.last_seen == {'primary': 1}
+
+
+def test_poll_interval_and_prune():
+    test_bus = InvalidationBus(poll_interval=3600, retention=0)
+    db = next(overriden_get_db())
+    test_bus.publish(db, 'film', 'test_film')
+    db.commit()
+    time.sleep(0.01)
+
+    assert test_bus.poll(db) == 0
+    assert test_bus.poll(db) == 0  # throttled
+    assert test_bus.prune(db) == 1
+    assert db.query(models.ChangeLog).count() == 0
+
+
+def test_ids_are_not_reused_after_pruning_everything():
+    test_bus = InvalidationBus(retention=0)
+    received = []
+    test_bus.subscribe('film', lambda key, _: received.append(key))
+    db = next(overriden_get_db())
+    test_bus.seek(db)
+    for i in range(5):
+        test_bus.publish(db, 'film', f'film_{i}')
+    db.commit()
+    time.sleep(0.01)
+    assert test_bus.poll(db) == 5  # prunes them as well
+    assert db.query(models.ChangeLog).count() == 0
+
+    test_bus.publish(db, 'film', 'after_prune')
+    db.commit()
+
+    assert test_bus.poll(db) == 1
+    assert received[-1] == 'after_prune'
+
+
+def test_change_log_is_migrated_to_autoincrement(tmp_path):
+    engine = make_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            'CREATE TABLE change_log (change_id INTEGER PRIMARY KEY, '
+            'topic VARCHAR NOT NULL, key VARCHAR NOT NULL, payload VARCHAR, '
+            'created_at FLOAT NOT NULL)'
+        )
+        connection.exec_driver_sql(
+            'CREATE INDEX ix_change_log_created_at ON change_log (created_at)'
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO change_log VALUES (7, 'film', 'test_film', NULL, 0)"
+        )
+
+    enable_autoincrement(engine, models.ChangeLog.__table__)
+    enable_autoincrement(engine, models.ChangeLog.__table__)
+
+    with engine.begin() as connection:
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'change_log'"
+        ).scalar()
+        assert 'AUTOINCREMENT' in sql
+        assert connection.exec_driver_sql(
+            'SELECT change_id, key FROM change_log'
+        ).fetchall() == [(7, 'test_film')]
+        connection.exec_driver_sql('DELETE FROM change_log')
+        connection.exec_driver_sql(
+            "INSERT INTO change_log (topic, key, created_at) VALUES ('film', 'x', 0)"
+        )
+        assert (
+            connection.exec_driver_sql('SELECT change_id FROM change_log').scalar() == 8
+        )
+    assert inspect(engine).get_indexes('change_log')
+    engine.dispose()
+
+
+@pytest.mark.usefixtures('client_w_review')
+def test_crud_publishes_changes():
+    db = next(overriden_get_db())
+    changes = db.query(models.ChangeLog.topic, models.ChangeLog.key).all()
+
+    assert changes == [
+        ('user', 'test_user'),
+        ('film', 'test_film'),
+        ('review', 'test_film'),
+    ]
+    assert bus.last_seen is not None
@@ -0,0 +1,135 @@
+import json
+import subprocess  # nosec
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from app import models
+from app.catalogue import catalogue
+from app.connections import get_db_router, get_review_shards
+from app.database import make_engine
+from app.invalidation import bus
+from app.main import create_app, on_shutdown
+from app.trending import timestamp, trending
+
+
+def test_create_app_does_not_touch_database(monkeypatch):
+    monkeypatch.delenv('SQLALCHEMY_DATABASE_URL', raising=False)
+    get_db_router.cache_clear()
+
+    create_app()
+
+    assert get_db_router.cache_info().currsize == 0
+
+
+def test_app_import_does_not_load_numpy():
+    code = 'import sys, app.main; print("numpy" in sys.modules)'
+    output = subprocess.run(  # nosec
+        [sys.executable, '-c', code], check=True, capture_output=True, text=True
+    ).stdout
+
+    assert output.strip() == 'False'
+
+
+def test_schema_is_created_on_startup_when_enabled(monkeypatch, tmp_path):
+    url = f'sqlite:///{tmp_path / "portal.db"}'
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URL', url)
+    monkeypatch.setenv('CREATE_SCHEMA', '1')
+    get_db_router.cache_clear()
+
+    with TestClient(create_app()):
+        assert get_db_router().engine.url.database.endswith('portal.db')
+
+    assert get_db_router.cache_info().currsize == 0
+    assert 'film_review' in inspect(create_engine(url)).get_table_names()
+
+
+def test_schema_is_not_created_by_default(monkeypatch, tmp_path):
+    url = f'sqlite:///{tmp_path / "portal.db"}'
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URL', url)
+    monkeypatch.setenv('CREATE_SCHEMA', '0')
+    get_db_router.cache_clear()
+
+    with TestClient(create_app()):
+        pass
+
+    assert inspect(create_engine(url)).get_table_names() == []
+
+
+def test_statement_cache_metrics(client):
+    response = client.get('/metrics/statement-cache/')
+
+    assert response.status_code == 200
+    assert set(response.json()) == {'hits', 'misses', 'uncached', 'hit_rate'}
+
+
+def test_catalogue_is_loaded_on_startup_when_enabled(monkeypatch, tmp_path):
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URL', f'sqlite:///{tmp_path / "portal.db"}')
+    monkeypatch.setenv('CREATE_SCHEMA', '1')
+    monkeypatch.setenv('CATALOGUE_INDEX', '1')
+    get_db_router.cache_clear()
+
+    with TestClient(create_app()):
+        assert catalogue.loaded
+
+    assert not catalogue.loaded
+
+
+def test_startup_refuses_unsharded_reviews(monkeypatch, tmp_path):
+    url = f'sqlite:///{tmp_path / "portal.db"}'
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URL', url)
+    monkeypatch.setenv('REVIEW_SHARD_URLS', f'sqlite:///{tmp_path / "shard.db"}')
+    monkeypatch.setenv('CREATE_SCHEMA', '1')
+    get_db_router.cache_clear()
+    get_review_shards.cache_clear()
+    primary = create_engine(url)
+    models.Base.metadata.create_all(bind=primary)
+    with primary.begin() as connection:
+        connection.execute(
+            models.FilmReview.__table__.insert(),
+            {'login': 'test_user', 'film_name': 'test_film', 'mark': 5},
+        )
+
+    try:
+        with pytest.raises(RuntimeError, match='shard-reviews'):
+            with TestClient(create_app()):
+                pass
+    finally:
+        on_shutdown()
+
+
+def test_startup_state_and_bus_agree(monkeypatch, tmp_path):
+    url = f'sqlite:///{tmp_path / "portal.db"}'
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URL', url)
+    monkeypatch.setenv('CREATE_SCHEMA', '1')
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+    get_db_router.cache_clear()
+    load = trending.load
+
+    def load_while_another_worker_writes(db):
+        other = make_engine(url)
+        with Session(bind=other) as other_db:
+            review = models.FilmReview(login='test_user', film_name='test_film', mark=5)
+            other_db.add(review)
+            other_db.flush()
+            payload = {
+                'login': 'test_user',
+                'mark': 5,
+                'created_at': timestamp(review.created_at),
+            }
+            bus.publish(other_db, 'review', 'test_film', json.dumps(payload))
+            other_db.commit()
+        other.dispose()
+        load(db)
+
+    monkeypatch.setattr(trending, 'load', load_while_another_worker_writes)
+
+    with TestClient(create_app()):
+        # the review came after the startup snapshot, so only the bus has it
+        assert trending.top('1h') == []
+        with get_db_router().write_session() as db:
+            assert bus.poll(db) == 1
+        assert trending.top('1h') == [('test_film', 1, 5.0)]
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models, passwords
+from app.fastapi_app import get_current_username
+from app.passwords import CredentialCache
+from tests.conftest import app, overriden_get_db
+
+legacy_hash = hashlib.sha256(b'test_password').hexdigest()
+
+
+def test_hash_and_verify():
+    hashed = passwords.hash_password('test_password')
+
+    assert hashed.startswith('scrypt$')
+    assert hashed != passwords.hash_password('test_password')  # salted
+    assert passwords.verify_password('test_password', hashed)
+    assert not passwords.verify_password('wrong_password', hashed)
+    assert not passwords.needs_rehash(hashed)
+
+
+def test_verify_legacy_hash():
+    assert passwords.is_legacy_hash(legacy_hash)
+    assert passwords.needs_rehash(legacy_hash)
+    assert passwords.verify_password('test_password', legacy_hash)
+    assert not passwords.verify_password('wrong_password', legacy_hash)
+
+
+@pytest.mark.parametrize(
+    'hashed', ['scrypt$', 'scrypt$1$8$1$AAAA$AAAA', 'scrypt$16384$8$1$!!$!!']
+)
+def test_verify_malformed_hash(hashed):
+    assert not passwords.verify_password('test_password', hashed)
+
+
+def test_credential_cache():
+    cache = CredentialCache(ttl=60, max_size=1)
+    cache.remember('user', 'password', 'hash')
+
+    assert cache.check('user', 'password', 'hash')
+    assert not cache.check('user', 'wrong_password', 'hash')
+    assert not cache.check('user', 'password', 'other_hash')
+    assert not cache.check('user', 'password', 'hash')  # forgotten above
+
+    cache.remember('user', 'password', 'hash')
+    cache.remember('other_user', 'password', 'hash')
+
+    assert not cache.check('user', 'password', 'hash')  # evicted
+    assert cache.check('other_user', 'password', 'hash')
+
+    cache.clear()
+    assert not cache.check('other_user', 'password', 'hash')
+
+
+def test_credential_cache_expires():
+    cache = CredentialCache(ttl=0)
+    cache.remember('user', 'password', 'hash')
+
+    assert not cache.check('user', 'password', 'hash')
+
+
+@pytest.fixture(name='auth_client')
+def auth_client_(client: TestClient) -> TestClient:
+    app.dependency_overrides.pop(get_current_username)
+    passwords.credential_cache.clear()
+    db = next(overriden_get_db())
+    db.add(models.User(login='test_user', hashed_password=legacy_hash))
+    db.commit()
+    return client
+
+
+def test_legacy_hash_is_upgraded_on_login(auth_client: TestClient):
+    response = auth_client.get('/films/', auth=('test_user', 'test_password'))
+
+    assert response.status_code == 200
+    db = next(overriden_get_db())
+    hashed = db.query(models.User).one().hashed_password
+    assert not passwords.needs_rehash(hashed)
+    assert passwords.verify_password('test_password', hashed)
+
+    response = auth_client.get('/films/', auth=('test_user', 'test_password'))
+    assert response.status_code == 200
+
+
+def test_verified_credentials_are_cached(auth_client: TestClient, monkeypatch):
+    calls = []
+    verify = passwords.verify_password
+    monkeypatch.setattr(
+        passwords,
+        'verify_password',
+        lambda *args: calls.append(args) or verify(*args),
+    )
+
+    for _ in range(3):
+        response = auth_client.get('/films/', auth=('test_user', 'test_password'))
+        assert response.status_code == 200
+
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    'auth', [('test_user', 'wrong_password'), ('unknown_user', 'test_password')]
+)
+def test_wrong_credentials(auth_client: TestClient, auth):
+    response = auth_client.get('/films/', auth=auth)
+
+    assert response.status_code == 401
+    assert response.headers['www-authenticate'] == 'Basic'
+
+
+def test_registration_hashes_on_kdf_pool(client: TestClient, monkeypatch):
+    threads = []
+    hash_password = passwords.hash_password
+
+    def record_thread(password):
+        threads.append(threading.current_thread().name)
+        return hash_password(password)
+
+    monkeypatch.setattr(passwords, 'hash_password', record_thread)
+
+    response = client.post(
+        '/users/', json={'login': 'new_user', 'password': 'test_password'}
+    )
+
+    assert response.status_code == 200
+    assert len(threads) == 1 and threads[0].startswith('kdf')
+
+
+def test_unknown_login_pays_for_kdf(auth_client: TestClient, monkeypatch):
+    calls = []
+    verify = passwords.verify_password
+    monkeypatch.setattr(
+        passwords,
+        'verify_password',
+        lambda *args: calls.append(args) or verify(*args),
+    )
+
+    response = auth_client.get('/films/', auth=('unknown_user', 'test_password'))
+
+    assert response.status_code == 401
+    assert calls == [('test_password', passwords.DUMMY_HASH)]
+    assert not passwords.needs_rehash(passwords.DUMMY_HASH)
@@ -0,0 +1,299 @@
+from types import SimpleNamespace
+
+import numpy
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import and_, func, lambda_stmt, or_, select
+
+from app import crud, models, schemas
+from app.database import make_engine
+from app.fastapi_app import get_current_username, get_db, get_read_db
+from app.invalidation import InvalidationBus, bus
+from app.sharding import ReviewShards, shards_of
+from app.snapshot import load_snapshot, take_snapshot
+from app.trending import trending
+from tests.conftest import app, engine
+
+
+@pytest.fixture(name='shards')
+def shards_(tmp_path):
+    shards = ReviewShards(
+        [make_engine(f'sqlite:///{tmp_path / f"shard{i}.db"}') for i in range(3)]
+    )
+    shards.create_schema()
+    yield shards
+    shards.dispose()
+
+
+@pytest.fixture(name='sharded_session')
+def sharded_session_(shards):
+    return shards.session_maker(engine)
+
+
+@pytest.fixture(name='client')
+def client_(client: TestClient, sharded_session) -> TestClient:
+    def sharded_get_db():
+        db = sharded_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = sharded_get_db
+    app.dependency_overrides[get_read_db] = sharded_get_db
+    return client
+
+
+def count_reviews(bind):
+    with bind.connect() as connection:
+        return connection.execute(
+            func.count(models.FilmReview.film_name).select()
+        ).scalar()
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_reviews_are_stored_on_their_shard(shards):
+    assert count_reviews(engine) == 0
+    assert sum(count_reviews(shard) for shard in shards.engines.values()) == 12
+
+    for name, shard in shards.engines.items():
+        with shard.connect() as connection:
+            film_names = connection.execute(
+                models.FilmReview.__table__.select()
+            ).fetchall()
+        assert all(shards.shard_for(row.film_name) == name for row in film_names)
+
+
+@pytest.mark.parametrize(
+    ('criterion', 'film_names'),
+    [
+        (models.FilmReview.film_name == 'test_film', ['test_film']),
+        (
+            models.FilmReview.film_name.in_(['test_film', 'telsfilm5']),
+            ['test_film', 'telsfilm5'],
+        ),
+        (
+            and_(
+                models.FilmReview.film_name == 'test_film',
+                models.FilmReview.login == 'test_user',
+            ),
+            ['test_film'],
+        ),
+        (
+            or_(models.FilmReview.film_name == 'test_film', models.FilmReview.mark > 1),
+            None,
+        ),
+        (models.FilmReview.mark > 1, None),
+    ],
+)
+def test_execute_chooser(shards, sharded_session, criterion, film_names):
+    context = SimpleNamespace(
+        statement=sharded_session()
+        .query(models.FilmReview)
+        .filter(criterion)
+        .statement,
+        parameters={},
+        all_mappers=[models.FilmReview.__mapper__],
+    )
+    expected = shards.names
+    if film_names is not None:
+        expected = sorted({shards.shard_for(name) for name in film_names})
+
+    assert shards._execute_chooser(context) == expected  # pylint: disable=W0212
+
+
+def test_execute_chooser_does_not_trust_cached_lambda_values(shards):
+    film_name = 'test_film'
+    context = SimpleNamespace(
+        statement=lambda_stmt(
+            lambda: select(models.FilmReview).where(
+                models.FilmReview.film_name == film_name
+            )
+        ),
+        parameters={},
+        all_mappers=[models.FilmReview.__mapper__],
+    )
+
+    assert shards._execute_chooser(context) == shards.names  # pylint: disable=W0212
+
+
+def test_read_films_filtered_by_average(client_w_many_reviews):
+    expected = [
+        {'name': 't_est_film3', 'release_year': 2016},
+        {'name': 'testie__film2', 'release_year': 2019},
+        {'name': 'te__st_film4', 'release_year': 2012},
+        {'name': 'test_film', 'release_year': 2019},
+    ]
+
+    response = client_w_many_reviews.get('/films/filter/average/')
+    assert response.json() == expected
+
+    response = client_w_many_reviews.get('/films/filter/average/?skip=1&limit=2')
+    assert response.json() == expected[1:3]
+
+
+def test_read_film_extended_info(client_w_many_reviews):
+    response = client_w_many_reviews.get('/films/t_est_film3/extended/')
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data['average_mark'] == 8.0
+    assert data['number_of_marks'] == 3
+    assert data['number_of_reviews'] == 3
+    assert [review['mark'] for review in data['reviews']] == [7, 8, 9]
+
+
+def test_read_user_reviews(client_w_many_reviews):
+    response = client_w_many_reviews.get('/users/me/reviews/?skip=1&limit=2')
+
+    assert [review['film_name'] for review in response.json()] == [
+        'te__st_film4',
+        'test_film',
+    ]
+
+
+def test_read_users_with_reviews(client_w_many_reviews):
+    response = client_w_many_reviews.get('/users/')
+
+    assert [len(user['film_reviews']) for user in response.json()] == [4, 4, 4]
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_get_users_loads_reviews_with_scatter(sharded_session, shards, monkeypatch):
+    calls = []
+    scatter = shards.scatter
+    monkeypatch.setattr(
+        shards, 'scatter', lambda query: calls.append(1) or scatter(query)
+    )
+    with sharded_session() as db:
+        users = crud.get_users(db, limit=2)
+        db.expunge_all()  # a lazy load from here on would fail
+
+    assert len(calls) == 1
+    assert [user.login for user in users] == ['test_user', 'not_test_user']
+    assert [review.film_name for review in users[0].film_reviews] == [
+        't_est_film3',
+        'te__st_film4',
+        'test_film',
+        'testie__film2',
+    ]
+
+
+def test_read_and_create_user_review(client_w_review):
+    response = client_w_review.get('/users/me/reviews/test_film/')
+    assert response.json() == {
+        'film_name': 'test_film',
+        'review': 'Good stuff',
+        'mark': 8,
+        'login': 'test_user',
+    }
+
+    app.dependency_overrides[get_current_username] = lambda: 'test_user'
+    response = client_w_review.post(
+        '/users/me/reviews/', json={'film_name': 'test_film', 'mark': 1}
+    )
+    assert response.status_code == 400
+    assert client_w_review.get('/films/test_film/reviews/').json()[0]['mark'] == 8
+
+
+def test_cached_statements_are_routed_by_current_film(client_w_many_reviews):
+    for film_name in ('test_film', 'te__st_film4', 'telsfilm5', 't_est_film3'):
+        response = client_w_many_reviews.get(f'/films/{film_name}/reviews/')
+        expected = 0 if film_name == 'telsfilm5' else 3
+        assert len(response.json()) == expected
+        assert all(review['film_name'] == film_name for review in response.json())
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_snapshot_reads_every_shard(sharded_session, tmp_path):
+    with sharded_session() as db:
+        manifest = take_snapshot(tmp_path, db)
+
+    assert manifest['tables']['film_review']['rows'] == 12
+    tables, strings = load_snapshot(tmp_path)
+    logins = [strings[code] for code in tables['film_review']['login']]
+    assert logins == sorted(logins)
+    assert numpy.sum(tables['film_review']['mark']) == 62
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_review_changes_are_logged_on_their_shard(shards):
+    def review_changes(bind):
+        with bind.connect() as connection:
+            return (
+                connection.execute(
+                    select(models.ChangeLog.key).where(
+                        models.ChangeLog.topic == 'review'
+                    )
+                )
+                .scalars()
+                .all()
+            )
+
+    assert review_changes(engine) == []
+    for name, shard in shards.engines.items():
+        keys = review_changes(shard)
+        assert all(shards.shard_for(key) == name for key in keys)
+    assert sum(len(review_changes(shard)) for shard in shards.engines.values()) == 12
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_bus_follows_every_shard(sharded_session):
+    test_bus = InvalidationBus(retention=3600)
+    received = []
+    test_bus.subscribe('review', lambda key, _: received.append(key))
+    test_bus.subscribe('film', lambda key, _: received.append(key))
+    db = sharded_session()
+    assert test_bus.poll(db) == 0
+    assert set(test_bus.last_seen) == {'primary', *shards_of(db).names}
+
+    crud.create_film(db, schemas.FilmCreate(name='new_film'))
+    for film_name in ('telsfilm5', 'new_film'):
+        crud.create_user_review(
+            db, 'test_user', schemas.ReviewCreate(film_name=film_name, mark=5)
+        )
+
+    assert test_bus.poll(db) == 3
+    assert sorted(received) == ['new_film', 'new_film', 'telsfilm5']
+    test_bus.retention = 0
+    assert test_bus.prune(db) == 23  # every change so far, on every database
+    db.close()
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_announced_review_is_not_polled_again(sharded_session, monkeypatch):
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+    with sharded_session() as db:
+        bus.poll(db)
+        crud.create_user_review(
+            db, 'test_user', schemas.ReviewCreate(film_name='telsfilm5', mark=5)
+        )
+        assert trending.top('1h', limit=100)[-1] == ('telsfilm5', 1, 5.0)
+
+        assert bus.poll(db) == 0
+
+
+def test_move_reviews(shards, sharded_session):
+    with engine.begin() as connection:
+        connection.execute(
+            models.FilmReview.__table__.insert(),
+            [
+                {'login': f'user_{i}', 'film_name': f'film_{i % 4}', 'mark': i}
+                for i in range(7)
+            ],
+        )
+    # a copy already on its shard, as after an interrupted move
+    with shards.engines[shards.shard_for('film_0')].begin() as connection:
+        connection.execute(
+            models.FilmReview.__table__.insert(),
+            {'login': 'user_0', 'film_name': 'film_0', 'mark': 0},
+        )
+    assert shards.unsharded_reviews(engine) == 7
+
+    assert shards.move_reviews(engine, batch_size=3) == 7
+
+    assert shards.unsharded_reviews(engine) == 0
+    assert count_reviews(engine) == 0
+    with sharded_session() as db:
+        reviews = db.query(models.FilmReview).all()
+    assert sorted(review.mark for review in reviews) == list(range(7))
@@ -0,0 +1,102 @@
+import io
+import zipfile
+
+import numpy
+import pytest
+from sqlalchemy import insert, select
+
+from app import models
+from app.database import make_engine
+from app.snapshot import (
+    NULL_INT,
+    load_snapshot,
+    read_transaction,
+    take_snapshot,
+    write_snapshot,
+)
+from tests.conftest import TestingSessionLocal
+
+
+def decode(codes, strings):
+    return [None if code == -1 else strings[code] for code in codes]
+
+
+@pytest.mark.usefixtures('client_w_many_reviews')
+def test_numpy_snapshot(tmp_path):
+    with TestingSessionLocal() as db:
+        manifest = take_snapshot(tmp_path, db)
+
+    assert manifest['format'] == 'numpy'
+    assert {name: table['rows'] for name, table in manifest['tables'].items()} == {
+        'film': 5,
+        'user': 3,
+        'film_review': 12,
+    }
+    assert 'hashed_password' not in manifest['tables']['user']['columns']
+
+    tables, strings = load_snapshot(tmp_path)
+    films = tables['film']
+    assert isinstance(films['name'], numpy.memmap)
+    assert decode(films['name'], strings) == [
+        'test_film',
+        'testie__film2',
+        't_est_film3',
+        'te__st_film4',
+        'telsfilm5',
+    ]
+    assert list(films['release_year']) == [2019, 2019, 2016, 2012, 2022]
+
+    reviews = tables['film_review']
+    assert reviews['mark'].sum() == 62
+    assert not numpy.isnan(reviews['created_at']).any()
+    # one dictionary for every table, so codes join directly
+    assert set(reviews['film_name']) <= set(films['name'])
+
+
+def test_numpy_snapshot_nulls(tmp_path):
+    with TestingSessionLocal() as db:
+        db.add(models.Film(name='no_year'))
+        db.execute(
+            insert(models.FilmReview.__table__).values(
+                login='test_user', film_name='no_year', mark=3, created_at=None
+            )
+        )
+        db.commit()
+        take_snapshot(tmp_path, db)
+
+    tables, strings = load_snapshot(tmp_path)
+    assert list(tables['film']['release_year']) == [NULL_INT]
+    assert decode(tables['film_review']['review'], strings) == [None]
+    assert numpy.isnan(tables['film_review']['created_at'][0])
+
+
+def test_snapshot_reads_one_transaction(tmp_path):
+    engine = make_engine(f'sqlite:///{tmp_path / "portal.db"}')
+    models.Base.metadata.create_all(bind=engine)
+    film = models.Film.__table__
+
+    with read_transaction(engine) as connection:
+        before = connection.execute(select(film)).fetchall()
+        with engine.begin() as writer:
+            writer.execute(insert(film).values(name='new_film'))
+        assert connection.execute(select(film)).fetchall() == before
+
+    engine.dispose()
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_snapshot(tmp_path, make_engine('sqlite://'), fmt='csv')
+
+
+def test_download_snapshot(client_w_many_reviews):
+    response = client_w_many_reviews.get(
+        '/snapshot/', headers={'Accept-Encoding': 'gzip'}
+    )
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+    assert 'manifest.json' in names
+    assert 'film_review.mark.npy' in names
@@ -0,0 +1,167 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect
+
+from app import models
+from app.database import add_missing_columns
+from app.invalidation import bus
+from app.trending import RollingCounter, TrendingIndex, timestamp, trending
+from tests.conftest import TestingSessionLocal
+
+HOUR = 3600.0
+
+
+def test_rolling_counter_ranks_by_count_then_average():
+    counter = RollingCounter(bucket_seconds=60, buckets=3)
+    for film_name, mark in [('a', 2), ('b', 9), ('b', 7), ('c', 10), ('c', 4)]:
+        counter.add(film_name, mark, 10.0)
+
+    assert counter.top(0, 10) == [('b', 2, 8.0), ('c', 2, 7.0), ('a', 1, 2.0)]
+    assert counter.top(1, 1) == [('c', 2, 7.0)]
+
+
+def test_rolling_counter_keeps_ranking_between_reads():
+    counter = RollingCounter(bucket_seconds=60, buckets=3)
+    counter.add('a', 2, 10.0)
+    assert counter.top(0, 10) == [('a', 1, 2.0)]
+
+    for film_name, mark in [('b', 9), ('b', 7), ('c', 10), ('a', 6), ('c', 4)]:
+        counter.add(film_name, mark, 20.0)
+        assert counter.top(0, 10) == sorted(
+            counter.top(0, 10), key=lambda film: (-film[1], -film[2], film[0])
+        )
+
+    assert counter.top(0, 10) == [('b', 2, 8.0), ('c', 2, 7.0), ('a', 2, 4.0)]
+
+    counter.add('a', 10, 70.0)
+    assert counter.top(0, 1) == [('a', 3, 6.0)]
+
+
+def test_rolling_counter_zero_marks_average_to_positive_zero():
+    counter = RollingCounter(bucket_seconds=60, buckets=3)
+    counter.add('a', 0, 10.0)
+
+    ((_, count, average),) = counter.top(0, 10)
+    assert (count, average) == (1, 0.0)
+    assert math.copysign(1, average) == 1
+
+
+def test_rolling_counter_expires_old_buckets():
+    counter = RollingCounter(bucket_seconds=60, buckets=3)
+    counter.add('a', 5, 0.0)
+    counter.add('b', 5, 60.0)
+    counter.add('b', 7, 120.0)
+
+    counter.advance(180.0)
+    assert counter.top(0, 10) == [('b', 2, 6.0)]
+
+    counter.advance(1000.0)
+    assert counter.top(0, 10) == []
+    assert counter.totals == {}
+
+
+def test_rolling_counter_ignores_reviews_older_than_window():
+    counter = RollingCounter(bucket_seconds=60, buckets=3)
+    counter.add('a', 5, 600.0)
+    counter.add('b', 5, 0.0)
+
+    assert counter.top(0, 10) == [('a', 1, 5.0)]
+
+
+def test_trending_index_windows(monkeypatch):
+    now = 10 * 86400.0
+    monkeypatch.setattr('app.trending.time.time', lambda: now)
+    index = TrendingIndex()
+    index.record('old', 5, now - 2 * 86400)
+    index.record('recent', 7, now - 2 * HOUR)
+    index.record('fresh', 9, now - 60)
+
+    assert [name for name, *_ in index.top('1h')] == ['fresh']
+    assert [name for name, *_ in index.top('24h')] == ['fresh', 'recent']
+    assert [name for name, *_ in index.top('7d')] == ['fresh', 'recent', 'old']
+    with pytest.raises(ValueError):
+        index.top('1y')
+
+
+def test_trending_index_load():
+    now = datetime.utcnow()
+    with TestingSessionLocal() as db:
+        for film_name, mark, age in [
+            ('a', 5, timedelta(minutes=5)),
+            ('b', 7, timedelta(hours=3)),
+            ('c', 9, timedelta(days=30)),
+        ]:
+            db.add(
+                models.FilmReview(
+                    login='test_user',
+                    film_name=film_name,
+                    mark=mark,
+                    created_at=now - age,
+                )
+            )
+        db.commit()
+
+        index = TrendingIndex()
+        index.load(db)
+
+    assert index.top('1h') == [('a', 1, 5.0)]
+    assert [name for name, *_ in index.top('7d')] == ['b', 'a']
+
+
+def test_read_trending_films(client_w_many_reviews, monkeypatch):
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+
+    response = client_w_many_reviews.get('/films/trending/?window=1h')
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {'name': 't_est_film3', 'number_of_marks': 3, 'average_mark': 8.0},
+        {'name': 'testie__film2', 'number_of_marks': 3, 'average_mark': 17 / 3},
+        {'name': 'te__st_film4', 'number_of_marks': 3, 'average_mark': 4.0},
+        {'name': 'test_film', 'number_of_marks': 3, 'average_mark': 3.0},
+    ]
+
+    response = client_w_many_reviews.get('/films/trending/?skip=1&limit=1')
+    assert [film['name'] for film in response.json()] == ['testie__film2']
+
+
+def test_review_is_counted_by_its_worker_at_once(client_w_film, monkeypatch):
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+    client_w_film.get('/films/')  # takes in the user and the film
+    monkeypatch.setattr(bus, 'poll_interval', 3600)
+
+    client_w_film.post('/users/me/reviews/', json={'film_name': 'test_film', 'mark': 8})
+
+    assert trending.top('1h') == [('test_film', 1, 8.0)]
+    monkeypatch.setattr(bus, 'poll_interval', 0)
+    with TestingSessionLocal() as db:
+        assert bus.poll(db) == 0  # already counted, not twice
+    assert trending.top('1h') == [('test_film', 1, 8.0)]
+
+
+def test_read_trending_films_unknown_window(client):
+    response = client.get('/films/trending/?window=1y')
+
+    assert response.status_code == 400
+
+
+def test_add_missing_columns(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    Table(
+        'film_review',
+        MetaData(),
+        Column('login', String, primary_key=True),
+        Column('film_name', String, primary_key=True),
+        Column('review', String),
+        Column('mark', Integer),
+    ).create(bind=engine)
+
+    add_missing_columns(engine, [models.FilmReview.__table__])
+    add_missing_columns(engine, [models.FilmReview.__table__])
+
+    inspector = inspect(engine)
+    assert 'created_at' in {c['name'] for c in inspector.get_columns('film_review')}
+    assert inspector.get_indexes('film_review')
+    assert timestamp(datetime(1970, 1, 2)) == 86400.0